@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib.admin.sites import AdminSite
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from innovatix.core.forms import ReadOnlyField
+from innovatix.core.models import WebhookEvent
 
 
 class CoreAdmin(admin.ModelAdmin):
@@ -39,3 +41,32 @@ class CoreAdmin(admin.ModelAdmin):
             )
 
         return form
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = [
+        "event_id",
+        "event_type",
+        "object_id",
+        "status",
+        "attempts",
+        "received_at",
+        "processed_at",
+    ]
+    list_filter = ["status", "event_type"]
+    search_fields = ["event_id", "object_id"]
+    readonly_fields = [field.name for field in WebhookEvent._meta.fields]
+    actions = ["requeue"]
+
+    @admin.action(description=_("Retry selected events"))
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=WebhookEvent.PROCESSING).update(
+            status=WebhookEvent.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, _("%(count)d events queued.") % {"count": count})
+
+    def has_add_permission(self, request):
+        return False
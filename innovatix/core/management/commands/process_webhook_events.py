@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from innovatix.core.webhooks import WebhookProcessor, webhook_registry
+
+
+class Command(BaseCommand):
+    help = "Handle the Stripe webhook events waiting in the inbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of events handled at the same time.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Maximum number of events claimed at once.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1,
+            help="Seconds to wait when the inbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Handle the events that are due now and exit.",
+        )
+
+    def handle(self, *args, **options):
+        processor = WebhookProcessor(
+            workers=options["workers"], batch_size=options["batch_size"]
+        )
+
+        if options["once"]:
+            total = processor.run(once=True)
+            self.stdout.write(self.style.SUCCESS(f"Handled {total} events"))
+            self.write_timings()
+            return
+
+        self.stdout.write("Waiting for Stripe webhook events...")
+
+        try:
+            processor.run(poll_interval=options["poll_interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+            self.write_timings()
+
+    def write_timings(self):
+        for event_type, timing in sorted(webhook_registry.stats().items()):
+            average = timing["total_seconds"] / timing["count"]
+            self.stdout.write(
+                f"{event_type}: {timing['count']} events, {timing['errors']} errors, "
+                f"avg {average * 1000:.1f}ms, max {timing['max_seconds'] * 1000:.1f}ms"
+            )
@@ -0,0 +1,227 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any
+
+import stripe
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from innovatix.core.models import ProcessedEvent, WebhookEvent
+from innovatix.core.services import payment_gateway
+from innovatix.core.webhooks import (
+    WebhookProcessor,
+    enqueue_event,
+    get_webhook_handlers,
+    webhook_registry,
+)
+
+
+def parse_time(value: str) -> datetime:
+    """
+    Parse a Unix timestamp or an ISO 8601 date and time.
+    """
+    if value.isdigit():
+        return timezone.make_aware(datetime.fromtimestamp(int(value)))
+
+    parsed = parse_datetime(value)
+
+    if parsed is None:
+        raise ValueError(f"Invalid date and time: {value}")
+
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the Stripe events of a time window through the webhook "
+        "handlers, e.g. to recover from an outage without a full sync"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--since",
+            type=parse_time,
+            help="Start of the window, as a Unix timestamp or ISO 8601 date and time.",
+        )
+        parser.add_argument(
+            "--until",
+            type=parse_time,
+            help="End of the window (defaults to now).",
+        )
+        parser.add_argument(
+            "--hours",
+            type=float,
+            help="Replay the last HOURS hours, instead of giving --since.",
+        )
+        parser.add_argument(
+            "--types",
+            nargs="+",
+            help="Only replay these event types (defaults to every handled type).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of events handled at the same time.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Maximum number of events claimed at once.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report which events would be replayed.",
+        )
+
+    def handle(self, *args: Any, **options: Any):
+        until = options["until"] or timezone.now()
+
+        if options["hours"] is not None:
+            since = until - timedelta(hours=options["hours"])
+        elif options["since"] is not None:
+            since = options["since"]
+        else:
+            raise CommandError("Give either --since or --hours.")
+
+        stripe_events = self.fetch_events(since, until, options["types"])
+
+        if options["dry_run"]:
+            self.report(stripe_events)
+            return
+
+        event_ids = [
+            webhook_event.event_id
+            for webhook_event in map(enqueue_event, stripe_events)
+            if webhook_event is not None
+        ]
+        requeued_ids = self.requeue_events(
+            [stripe_event.id for stripe_event in stripe_events], event_ids
+        )
+        self.stdout.write(
+            f"Queued {len(event_ids)} events, "
+            f"retrying {len(requeued_ids)} events already in the inbox"
+        )
+        event_ids += requeued_ids
+
+        if event_ids:
+            self.replay(event_ids, options["workers"], options["batch_size"])
+
+    def requeue_events(self, event_ids: list[str], queued_ids: list[str]) -> list[str]:
+        """
+        Make the dead events, and the pending events waiting for a retry, of
+        ``event_ids`` due right away, with a fresh number of attempts.
+
+        :return: The IDs of these events.
+        """
+        webhook_events = WebhookEvent.objects.filter(
+            event_id__in=event_ids,
+            status__in=[WebhookEvent.PENDING, WebhookEvent.DEAD],
+        ).exclude(event_id__in=queued_ids)
+        requeued_ids = list(webhook_events.values_list("event_id", flat=True))
+
+        WebhookEvent.objects.filter(
+            event_id__in=requeued_ids,
+            status__in=[WebhookEvent.PENDING, WebhookEvent.DEAD],
+        ).update(
+            status=WebhookEvent.PENDING, next_attempt_at=timezone.now(), attempts=0
+        )
+
+        return requeued_ids
+
+    def fetch_events(
+        self, since: datetime, until: datetime, types: list[str] | None
+    ) -> list[stripe.Event]:
+        """
+        Return the handled events created in the window, oldest first.
+        """
+        params = {
+            "created": {"gte": int(since.timestamp()), "lte": int(until.timestamp())},
+            "limit": 100,
+        }
+
+        if types:
+            params["types"] = types
+
+        self.stdout.write(f"Fetching Stripe events from {since} to {until}...")
+        stripe_events = []
+
+        for count, stripe_event in enumerate(
+            payment_gateway.iter_all("Event", **params), start=1
+        ):
+            if get_webhook_handlers(stripe_event.type):
+                stripe_events.append(stripe_event)
+            if count % 1000 == 0:
+                self.stdout.write(f"  {count} events fetched")
+
+        # Stripe lists events newest first.
+        stripe_events.sort(key=lambda stripe_event: stripe_event.created)
+
+        return stripe_events
+
+    def report(self, stripe_events: list[stripe.Event]) -> None:
+        processed = set(
+            ProcessedEvent.objects.filter(
+                event_id__in=[stripe_event.id for stripe_event in stripe_events],
+                processed=True,
+            ).values_list("event_id", flat=True)
+        )
+        pending = Counter(
+            stripe_event.type
+            for stripe_event in stripe_events
+            if stripe_event.id not in processed
+        )
+
+        for event_type, count in sorted(pending.items()):
+            self.stdout.write(f"{event_type}: {count} events")
+
+        self.stdout.write(
+            f"Would replay {sum(pending.values())} events, "
+            f"{len(processed)} were already processed"
+        )
+
+    def replay(self, event_ids: list[str], workers: int, batch_size: int) -> None:
+        processor = WebhookProcessor(workers=workers, batch_size=batch_size)
+        started_at = time.monotonic()
+        handled = 0
+
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+        # Other pending inbox events are drained too; they would block the
+        # replayed events of the same objects otherwise.
+        try:
+            processor.release_stale()
+
+            while claimed := processor.run_once(executor):
+                handled += claimed
+                self.stdout.write(
+                    f"  {handled} events handled ({time.monotonic() - started_at:.1f}s)"
+                )
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+        statuses = Counter(
+            WebhookEvent.objects.filter(event_id__in=event_ids).values_list(
+                "status", flat=True
+            )
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Replayed {len(event_ids)} events: {statuses[WebhookEvent.DONE]} done, "
+                f"{statuses[WebhookEvent.SKIPPED]} skipped, "
+                f"{statuses[WebhookEvent.PENDING]} waiting for a retry, "
+                f"{statuses[WebhookEvent.DEAD]} failed"
+            )
+        )
+
+        for event_type, timing in sorted(webhook_registry.stats().items()):
+            self.stdout.write(
+                f"{event_type}: {timing['count']} events, {timing['errors']} errors, "
+                f"max {timing['max_seconds'] * 1000:.1f}ms"
+            )
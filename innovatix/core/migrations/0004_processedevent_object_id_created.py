@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedevent',
+            name='object_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='processedevent',
+            name='created',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='processedevent',
+            index=models.Index(fields=['object_id', 'created'], name='processed_event_object_idx'),
+        ),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('skipped', 'Skipped'), ('dead', 'Dead')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,12 +1,128 @@
 from django.db import models
+from django.utils import timezone
 
 
 class ProcessedEvent(models.Model):
+    """
+    Stripe events that were already handled.
+
+    ``object_id`` and ``created`` (the event's Stripe timestamp) record how
+    recent the last handled event of each Stripe object is, so events
+    delivered late can be recognized and skipped.
+    """
+
     event_id = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     processed = models.BooleanField(default=False)
     event_type = models.CharField(max_length=255, blank=True)
+    object_id = models.CharField(max_length=255, blank=True)
+    created = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["object_id", "created"], name="processed_event_object_idx"
+            ),
+        ]
+
+    @classmethod
+    def is_processed(cls, event_id: str) -> bool:
+        return cls.objects.filter(event_id=event_id, processed=True).exists()
+
+    @classmethod
+    def is_stale(cls, object_id: str, created: int) -> bool:
+        """
+        Whether a newer event of the Stripe object was already handled.
+        """
+        if not object_id:
+            return False
+
+        return cls.objects.filter(
+            object_id=object_id, created__gt=created, processed=True
+        ).exists()
 
     def __str__(self):
         return f"Event {self.event_id} processed: {self.processed}"
+
+
+class SyncState(models.Model):
+    """
+    High-water mark of the last successful Stripe sync, per resource.
+
+    ``high_water_mark`` is a Stripe timestamp: incremental syncs only fetch
+    objects created, and events emitted, at or after it.
+    """
+
+    resource = models.CharField(max_length=50, unique=True)
+    high_water_mark = models.PositiveBigIntegerField(default=0)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_high_water_mark(cls, resource: str) -> int | None:
+        return (
+            cls.objects.filter(resource=resource)
+            .values_list("high_water_mark", flat=True)
+            .first()
+        )
+
+    @classmethod
+    def mark(cls, resource: str, high_water_mark: int) -> None:
+        cls.objects.update_or_create(
+            resource=resource, defaults={"high_water_mark": high_water_mark}
+        )
+
+    def __str__(self):
+        return f"{self.resource} synced up to {self.high_water_mark}"
+
+
+class WebhookEvent(models.Model):
+    """
+    Inbox of Stripe webhook events.
+
+    The webhook endpoint only stores the payload and answers Stripe; the
+    events are handled later by ``process_webhook_events`` workers, in
+    ``created`` order per Stripe object, with retries and backoff. Events that
+    keep failing end up ``DEAD`` for manual inspection. Events that were
+    already handled, or that are older than the last handled event of their
+    object, end up ``SKIPPED``.
+    """
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    SKIPPED = "skipped"
+    DEAD = "dead"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (PROCESSING, "Processing"),
+        (DONE, "Done"),
+        (SKIPPED, "Skipped"),
+        (DEAD, "Dead"),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=255)
+    object_id = models.CharField(max_length=255, blank=True)
+    created = models.PositiveBigIntegerField(help_text="Stripe timestamp of the event.")
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="webhook_event_due_idx"
+            ),
+            models.Index(
+                fields=["object_id", "created"], name="webhook_event_object_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Event {self.event_id} ({self.event_type}): {self.status}"
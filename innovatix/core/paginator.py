@@ -0,0 +1,59 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the database's row estimate for large, unfiltered
+    tables instead of running ``SELECT COUNT(*)``, which scans the whole
+    table on PostgreSQL.
+
+    Filtered querysets, small tables and databases without a cheap estimate
+    still get an exact count. Pair it with ``show_full_result_count = False``
+    on the admin so the changelist does not count the table a second time.
+    """
+
+    exact_count_threshold = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        estimate = self.get_estimated_count()
+
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+
+        return estimate
+
+    def get_estimated_count(self) -> int | None:
+        queryset = self.object_list
+
+        if not isinstance(queryset, QuerySet) or queryset.query.where:
+            return None
+
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [connection.ops.quote_name(table)],
+                )
+            elif connection.vendor == "mysql":
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s",
+                    [table],
+                )
+            else:
+                return None
+
+            row = cursor.fetchone()
+
+        # PostgreSQL reports -1 for tables that were never analyzed.
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+
+        return int(row[0])
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Iterable, TypeVar
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+
+M = TypeVar("M", bound=models.Model)
+
+
+class CachedResolver(Generic[M]):
+    """
+    Look up rows of ``model`` by a natural key, usually an external Stripe ID,
+    remembering recent results in a small LRU cache with a TTL.
+
+    Webhook handlers, sync commands and forms resolve the same few customers,
+    memberships, countries and provinces over and over; with a resolver each
+    of them costs one query per ``ttl`` instead of one per event. Entries are
+    evicted when a row of ``model`` is saved or deleted in this process, and
+    the TTL bounds how long writes made elsewhere (other processes, bulk
+    updates) can go unnoticed. Misses are never cached.
+
+    Rows read inside a transaction are only cached once it commits, so a
+    rollback cannot leave rows that no longer exist in the cache.
+
+    :param fields: Field, or tuple of fields, forming the key.
+    :param maxsize: Maximum number of rows kept.
+    :param ttl: Seconds a row is kept.
+    """
+
+    def __init__(
+        self,
+        model: type[M],
+        fields: str | tuple[str, ...],
+        maxsize: int = 1024,
+        ttl: float = 60,
+    ):
+        self.model = model
+        self.fields = (fields,) if isinstance(fields, str) else fields
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[Hashable, tuple[float, M]] = OrderedDict()
+        # Keys of each cached row, so a write evicts it without a scan.
+        self._keys_by_pk: dict[Any, set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+        post_save.connect(self._on_write, sender=model, weak=False)
+        post_delete.connect(self._on_write, sender=model, weak=False)
+
+    def _get_key(self, values: Any) -> Hashable:
+        return values if len(self.fields) > 1 else (values,)
+
+    def _get_cached(self, key: Hashable) -> M | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # Callers get their own copy, so changes to it never leak into the cache.
+        return copy.copy(entry[1])
+
+    def _remove(self, key: Hashable) -> None:
+        """
+        Drop ``key``; the lock must be held.
+        """
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            keys = self._keys_by_pk.get(entry[1].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_pk[entry[1].pk]
+
+    def _store(self, key: Hashable, obj: M) -> None:
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, copy.copy(obj))
+            self._keys_by_pk.setdefault(obj.pk, set()).add(key)
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def _store_on_commit(self, key: Hashable, obj: M) -> None:
+        # Runs right away outside of transactions.
+        transaction.on_commit(
+            lambda: self._store(key, obj), using=obj._state.db or "default"
+        )
+
+    def get(self, *values: Any) -> M:
+        """
+        Return the row whose key fields equal ``values``.
+
+        :raises model.DoesNotExist: If there is no such row.
+        """
+        key = tuple(values)
+        obj = self._get_cached(key)
+
+        if obj is None:
+            obj = self.model.objects.get(**dict(zip(self.fields, key)))
+            self._store_on_commit(key, obj)
+
+        return obj
+
+    def get_many(self, values: Iterable[Any]) -> dict[Any, M]:
+        """
+        Return the existing rows for every key in ``values``, fetching the
+        ones not cached with a single query.
+
+        For single-field resolvers ``values`` are plain values; otherwise
+        tuples of values.
+        """
+        found, missing = {}, []
+
+        for value in set(values):
+            obj = self._get_cached(self._get_key(value))
+
+            if obj is None:
+                missing.append(value)
+            else:
+                found[value] = obj
+
+        if missing:
+            if len(self.fields) == 1:
+                queryset = self.model.objects.filter(
+                    **{f"{self.fields[0]}__in": missing}
+                )
+            else:
+                query = models.Q()
+                for value in missing:
+                    query |= models.Q(**dict(zip(self.fields, value)))
+                queryset = self.model.objects.filter(query)
+
+            for obj in queryset:
+                key = tuple(getattr(obj, field) for field in self.fields)
+                self._store_on_commit(key, obj)
+                found[key if len(self.fields) > 1 else key[0]] = obj
+
+        return found
+
+    def evict(self, *values: Any) -> None:
+        """
+        Forget the rows of the given keys.
+        """
+        with self._lock:
+            for value in values:
+                self._remove(self._get_key(value))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_pk.clear()
+
+    def _on_write(self, sender: type[M], instance: M, **kwargs: Any) -> None:
+        self._evict_row(instance)
+        # Again on commit: another thread may have cached the old row meanwhile.
+        transaction.on_commit(
+            lambda: self._evict_row(instance), using=kwargs.get("using", "default")
+        )
+
+    def _evict_row(self, instance: M) -> None:
+        with self._lock:
+            # By primary key, since the key fields may have changed.
+            for key in list(self._keys_by_pk.get(instance.pk, ())):
+                self._remove(key)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
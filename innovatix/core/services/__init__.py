@@ -1,5 +1,10 @@
 from django.conf import settings
 
+from innovatix.core.services.http_client import get_default_http_client
 from innovatix.core.services.payment_gateways import CoreStripePaymentGateway
 
-payment_gateway = CoreStripePaymentGateway(settings.STRIPE_SECRET_KEY)
+payment_gateway = CoreStripePaymentGateway(
+    settings.STRIPE_SECRET_KEY,
+    getattr(settings, "STRIPE_WEBHOOK_SECRET", None),
+    http_client=get_default_http_client(),
+)
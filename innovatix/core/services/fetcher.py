@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Iterator
+
+from innovatix.core.services.pagination import PageBuffer
+from innovatix.core.services.rate_limiter import TokenBucket
+
+if TYPE_CHECKING:
+    from innovatix.core.services.payment_gateways import CoreStripePaymentGateway
+
+
+class ConcurrentFetcher:
+    """
+    Fetch several Stripe list crawls at the same time.
+
+    Every stream returned by ``submit`` is crawled on its own background
+    thread, ``prefetch`` pages ahead of its consumer, so a caller can start all
+    the crawls it needs up front and then apply the results in whatever order
+    the database requires. The number of requests in flight is capped at
+    ``max_workers`` and, when given, the total request rate at
+    ``requests_per_second``.
+
+    Use it as a context manager so pending crawls are stopped on exit::
+
+        with ConcurrentFetcher(payment_gateway, requests_per_second=20) as fetcher:
+            customers = fetcher.submit("Customer", limit=100)
+            invoices = fetcher.submit("Invoice", limit=100)
+
+            for customer in customers:
+                ...
+    """
+
+    def __init__(
+        self,
+        payment_gateway: CoreStripePaymentGateway,
+        max_workers: int = 5,
+        requests_per_second: float | None = None,
+        prefetch: int = 10,
+    ):
+        self.payment_gateway = payment_gateway
+        self.max_workers = max_workers
+        self.prefetch = prefetch
+        self.bucket = TokenBucket(requests_per_second) if requests_per_second else None
+
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._buffers: list[PageBuffer] = []
+
+    def __enter__(self) -> ConcurrentFetcher:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @contextmanager
+    def throttle(self) -> Iterator[None]:
+        """
+        Hold one request slot, within the requests-per-second budget.
+        """
+        with self._slots:
+            if self.bucket:
+                self.bucket.acquire()
+            yield
+
+    def submit(self, resource: str, **kwargs: Any) -> Iterator[Any]:
+        """
+        Start crawling ``resource`` in the background.
+
+        :return: An iterator over every object of the resource, in Stripe order.
+        """
+        pages = self.payment_gateway._iter_pages(
+            resource, throttle=self.throttle, **kwargs
+        )
+        buffer = PageBuffer(pages, size=self.prefetch).start()
+        self._buffers.append(buffer)
+
+        return (item for page in buffer for item in page)
+
+    def close(self) -> None:
+        for buffer in self._buffers:
+            buffer.close()
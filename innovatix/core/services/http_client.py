@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("django")
+
+
+class PooledHTTPClient(stripe.http_client.RequestsClient):
+    """
+    Stripe HTTP client backed by one keep-alive connection pool.
+
+    Stripe's default client opens a session per thread, so each worker thread
+    (and each short-lived request thread) pays its own TLS handshake. This
+    client shares a single ``requests`` session whose adapter keeps up to
+    ``pool_size`` connections to the API open, reusing them across threads
+    and across consecutive calls such as the ones made during checkout.
+
+    :param pool_size: Number of keep-alive connections kept per host.
+    :param connect_timeout: Seconds to wait for a new connection.
+    :param read_timeout: Seconds to wait for Stripe to answer.
+    :param block: Wait for a free connection instead of opening extra,
+        non-pooled connections once ``pool_size`` are busy.
+    """
+
+    name = "pooled-requests"
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+        block: bool = False,
+        **kwargs: Any,
+    ):
+        self.pool_size = pool_size
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=block,
+            max_retries=0,
+        )
+        session = requests.Session()
+        session.mount("https://", self.adapter)
+        session.headers["Connection"] = "keep-alive"
+
+        # Coroutines (``*_async`` calls) go through Stripe's async client
+        # (httpx or aiohttp, when installed), which pools its own connections.
+        kwargs.setdefault(
+            "async_fallback_client",
+            stripe.http_client.new_http_client_async_fallback(),
+        )
+
+        super().__init__(
+            timeout=(connect_timeout, read_timeout), session=session, **kwargs
+        )
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return request and connection counters of the pool.
+
+        ``connections`` is the number of connections (TLS handshakes) opened
+        so far; when it stays well below ``requests`` the pool is doing its
+        job.
+        """
+        pools = self.adapter.poolmanager.pools
+        stats = {
+            "pool_size": self.pool_size,
+            "requests": 0,
+            "connections": 0,
+            "idle": 0,
+        }
+
+        for key in pools.keys():
+            pool = pools[key]
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+            # Empty slots of the pool queue hold ``None`` placeholders.
+            stats["idle"] += sum(1 for conn in list(pool.pool.queue) if conn)
+
+        return stats
+
+    def close(self) -> None:
+        self._session.close()
+
+
+_default_http_client: PooledHTTPClient | None = None
+_default_http_client_lock = threading.Lock()
+
+
+def get_default_http_client() -> PooledHTTPClient:
+    """
+    Return the pooled HTTP client shared by every payment gateway in this process.
+    """
+    global _default_http_client
+
+    with _default_http_client_lock:
+        if _default_http_client is None:
+            _default_http_client = PooledHTTPClient(
+                pool_size=getattr(settings, "STRIPE_HTTP_POOL_SIZE", 10),
+                connect_timeout=getattr(settings, "STRIPE_HTTP_CONNECT_TIMEOUT", 5),
+                read_timeout=getattr(settings, "STRIPE_HTTP_READ_TIMEOUT", 30),
+            )
+
+        return _default_http_client
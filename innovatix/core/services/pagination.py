@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger("django")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class PageBuffer:
+    """
+    Bounded, thread-safe hand-off between a page producer and its consumer.
+
+    ``fill`` drains the producer iterator (usually a paginated Stripe ``list``
+    crawl) and blocks once ``size`` pages are waiting, so memory stays flat no
+    matter how large the account is (``size=0`` removes the bound). Iterating
+    the buffer yields the pages in order; errors raised by the producer are
+    re-raised on the consumer side.
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, pages: Iterable[list[Any]], size: int = 1):
+        self._pages = pages
+        self._queue: queue.Queue = queue.Queue(maxsize=max(size, 0))
+        self._closed = threading.Event()
+
+    def _put(self, item: Any) -> bool:
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=self.POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fill(self) -> None:
+        """
+        Run the producer until it is exhausted or the consumer goes away.
+        """
+        try:
+            for page in self._pages:
+                if not self._put(page):
+                    return
+        except Exception as err:
+            logger.error(f"Failed fetching page: {err}")
+            self._put(_Failure(err))
+            return
+
+        self._put(_DONE)
+
+    def start(self) -> PageBuffer:
+        """
+        Fill the buffer from a dedicated daemon thread.
+        """
+        threading.Thread(target=self.fill, daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self._closed.set()
+
+    def __iter__(self) -> Iterator[list[Any]]:
+        try:
+            while True:
+                item = self._queue.get()
+
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+
+                yield item
+        finally:
+            self.close()
@@ -1,12 +1,27 @@
 from __future__ import annotations
 
+import json
 import logging
-from typing import TYPE_CHECKING, Any
+from contextlib import nullcontext
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Iterator,
+)
 
 import stripe
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from innovatix.core.services.abstract_payment_gateways import CoreAbstractPaymentGateway
+from innovatix.core.services.http_client import PooledHTTPClient
+from innovatix.core.services.pagination import PageBuffer
+from innovatix.core.services.request_scheduler import (
+    StripeRequestScheduler,
+    get_default_scheduler,
+)
 
 if TYPE_CHECKING:
     from innovatix.users.models import CustomerUser
@@ -19,10 +34,89 @@ class CoreStripePaymentGateway(CoreAbstractPaymentGateway):
     Stripe-specific implementation of the Stripe payment gateway.
     """
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        webhook_secret: str | None = None,
+        scheduler: StripeRequestScheduler | None = None,
+        http_client: PooledHTTPClient | None = None,
+    ):
+        """
+        :param webhook_secret: Signing secret of the Stripe webhook endpoint.
+        :param scheduler: Rate limiter and retry policy for the API calls.
+            Defaults to the one shared by the whole process.
+        :param http_client: HTTP client installed for every Stripe call, e.g.
+            ``get_default_http_client()`` to reuse pooled keep-alive
+            connections. Stripe's own client is kept when omitted.
+        """
 
         self.stripe = stripe
         self.stripe.api_key = api_key
+        self.webhook_secret = webhook_secret
+        self.scheduler = scheduler or get_default_scheduler()
+
+        if http_client is not None:
+            self.stripe.default_http_client = http_client
+
+    def execute(
+        self, func: Callable[..., Any], *args: Any, mutating: bool = False, **kwargs
+    ) -> Any:
+        """
+        Send a Stripe API call through the shared request scheduler.
+
+        :param func: The Stripe API method, e.g. ``self.stripe.Customer.create``.
+        :param mutating: Whether the call changes data on Stripe, in which
+            case it is sent with an idempotency key.
+        """
+        return self.scheduler.call(func, *args, mutating=mutating, **kwargs)
+
+    async def aexecute(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        mutating: bool = False,
+        **kwargs,
+    ) -> Any:
+        """
+        Async version of ``execute`` for the ``*_async`` Stripe methods.
+        """
+        return await self.scheduler.acall(func, *args, mutating=mutating, **kwargs)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return the request scheduler counters and, when pooled, the HTTP
+        connection pool statistics.
+        """
+        stats = {"scheduler": self.scheduler.stats()}
+        http_client = self.stripe.default_http_client
+
+        if isinstance(http_client, PooledHTTPClient):
+            stats["http_pool"] = http_client.stats()
+
+        return stats
+
+    def parse_webhook(self, payload: bytes, sig_header: str | None) -> dict[str, Any]:
+        """
+        Verify the ``Stripe-Signature`` header of a webhook request and
+        decode its payload.
+
+        :raises stripe.error.SignatureVerificationError: If the signature is
+            missing, invalid or too old.
+        :raises ValueError: If the payload is not valid JSON.
+        """
+        if not self.webhook_secret:
+            raise self.stripe.error.SignatureVerificationError(
+                "No webhook secret configured", sig_header, payload
+            )
+
+        self.stripe.WebhookSignature.verify_header(
+            payload.decode("utf-8"),
+            sig_header or "",
+            self.webhook_secret,
+            self.stripe.Webhook.DEFAULT_TOLERANCE,
+        )
+
+        return json.loads(payload)
 
     def _get_customer_data(
         self, obj: CustomerUser, **kwargs: dict[str, Any]
@@ -65,7 +159,11 @@ class CoreStripePaymentGateway(CoreAbstractPaymentGateway):
         :param obj: CustomerUser model instance.
         """
 
-        return self.stripe.Customer.create(**self._get_customer_data(obj, **kwargs))
+        return self.execute(
+            self.stripe.Customer.create,
+            mutating=True,
+            **self._get_customer_data(obj, **kwargs),
+        )
 
     def update_customer(self, obj: CustomerUser) -> stripe.Customer:
         """
@@ -78,8 +176,11 @@ class CoreStripePaymentGateway(CoreAbstractPaymentGateway):
             if not obj.external_customer_id:
                 return self.create_customer(obj)
 
-            return self.stripe.Customer.modify(
-                obj.external_customer_id, **self._get_customer_data(obj)
+            return self.execute(
+                self.stripe.Customer.modify,
+                obj.external_customer_id,
+                mutating=True,
+                **self._get_customer_data(obj),
             )
         except Exception as e:
             logger.error(f"Failed updating or creating Stripe customer: {e}")
@@ -87,28 +188,61 @@ class CoreStripePaymentGateway(CoreAbstractPaymentGateway):
 
     def delete_customer(self, customer_id: str):
         try:
-            return self.stripe.Customer.delete(customer_id)
+            return self.execute(self.stripe.Customer.delete, customer_id, mutating=True)
         except Exception as err:
             logger.error(f"Failed deleting Stripe customer: {err}")
 
-    def fetch_all(
-        self, resource: str, all: bool = True, **kwargs: dict[str, Any]
-    ) -> list[Any]:
-        response = {"has_more": True}
+    def _iter_pages(
+        self,
+        resource: str,
+        throttle: Callable[[], ContextManager] = nullcontext,
+        **kwargs: dict[str, Any],
+    ) -> Iterator[list[Any]]:
+        stripe_resource = getattr(self.stripe, resource)
         starting_after = None
 
-        all_items = []
-
-        while response.get("has_more"):
-            stripe_resource = getattr(self.stripe, resource)
-            response = stripe_resource.list(starting_after=starting_after, **kwargs)
+        while True:
+            with throttle():
+                response = self.execute(
+                    stripe_resource.list, starting_after=starting_after, **kwargs
+                )
             items = response["data"]
-            all_items.extend(items)
 
-            if response.get("has_more"):
-                starting_after = items[-1]["id"]
+            if items:
+                yield items
+
+            if not response.get("has_more") or not items:
+                return
+
+            starting_after = items[-1]["id"]
+
+    def iter_all(
+        self, resource: str, prefetch: int = 1, **kwargs: dict[str, Any]
+    ) -> Iterator[Any]:
+        """
+        Yield every object of a Stripe resource, page by page.
 
-            if not all:
-                break
+        While the caller works through the current page, up to ``prefetch``
+        following pages are fetched in the background. Use ``prefetch=0`` to
+        fetch each page only when the previous one has been consumed.
+
+        :param resource: Name of the Stripe resource, e.g. ``"Customer"``.
+        :param prefetch: Number of pages to fetch ahead of the consumer.
+        :param kwargs: Parameters passed to the resource ``list`` call.
+        """
+
+        pages = self._iter_pages(resource, **kwargs)
+
+        if prefetch > 0:
+            pages = PageBuffer(pages, size=prefetch).start()
+
+        for page in pages:
+            yield from page
+
+    def fetch_all(
+        self, resource: str, all: bool = True, **kwargs: dict[str, Any]
+    ) -> list[Any]:
+        if not all:
+            return next(self._iter_pages(resource, **kwargs), [])
 
-        return all_items
+        return list(self.iter_all(resource, prefetch=0, **kwargs))
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to keep Stripe calls within a request budget.
+
+    ``rate`` tokens are added per second, up to ``capacity`` (which defaults to
+    one second worth of tokens). Each call to ``acquire`` takes one token,
+    sleeping until one is available.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("The rate must be greater than zero")
+
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take ``tokens`` from the bucket, blocking until they are available.
+
+        :return: The number of seconds spent waiting.
+        """
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                self._refill()
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+
+                delay = (tokens - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Take ``tokens`` from the bucket without blocking, going into debt if
+        needed.
+
+        Used by coroutines, which must not sleep on the event loop thread.
+
+        :return: The number of seconds the caller must wait before sending.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+
+            return max(0.0, -self._tokens / self.rate)
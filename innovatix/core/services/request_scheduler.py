@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+import stripe
+from django.conf import settings
+
+from innovatix.core.services.rate_limiter import TokenBucket
+
+logger = logging.getLogger("django")
+
+
+class StripeRequestScheduler:
+    """
+    Throttle and retry Stripe API calls.
+
+    Calls take a token from a shared bucket before going out. The bucket rate
+    adapts: it is halved whenever Stripe answers 429 and grows back by
+    ``recovery_step`` per successful call, up to ``requests_per_second``.
+    Rate-limit, connection and 5xx errors are retried with jittered
+    exponential backoff, waiting at least as long as Stripe's ``Retry-After``
+    header asks. Mutating calls get an idempotency key that is reused across
+    retries, so a retried create never charges or creates twice.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 25,
+        min_requests_per_second: float = 1,
+        recovery_step: float = 0.5,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30,
+    ):
+        self.max_requests_per_second = requests_per_second
+        self.min_requests_per_second = min_requests_per_second
+        self.recovery_step = recovery_step
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(requests_per_second)
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "throttled": 0,
+            "throttled_seconds": 0.0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+        }
+
+    def _increment(self, counter: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[counter] += value
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {**self._counters, "requests_per_second": self.bucket.rate}
+
+    def _slow_down(self) -> None:
+        self.bucket.set_rate(max(self.min_requests_per_second, self.bucket.rate / 2))
+
+    def _speed_up(self) -> None:
+        if self.bucket.rate < self.max_requests_per_second:
+            self.bucket.set_rate(
+                min(
+                    self.max_requests_per_second,
+                    self.bucket.rate + self.recovery_step,
+                )
+            )
+
+    def _is_retryable(self, err: stripe.error.StripeError) -> bool:
+        if isinstance(
+            err, (stripe.error.RateLimitError, stripe.error.APIConnectionError)
+        ):
+            return True
+
+        return (err.http_status or 500) >= 500 and isinstance(
+            err, stripe.error.APIError
+        )
+
+    def _get_delay(self, attempt: int, err: stripe.error.StripeError) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+        try:
+            retry_after = float((err.headers or {}).get("Retry-After", 0))
+        except (TypeError, ValueError):
+            retry_after = 0
+
+        return max(delay, retry_after)
+
+    def _record_request(self, waited: float) -> None:
+        self._increment("requests")
+
+        if waited:
+            self._increment("throttled")
+            self._increment("throttled_seconds", waited)
+
+    def _get_retry_delay(self, attempt: int, err: stripe.error.StripeError) -> float:
+        """
+        Record a failed attempt and return how long to wait before the next
+        one, re-raising ``err`` when it must not be retried.
+        """
+        if isinstance(err, stripe.error.RateLimitError):
+            self._increment("rate_limited")
+            self._slow_down()
+
+        if attempt >= self.max_retries or not self._is_retryable(err):
+            self._increment("failures")
+            raise err
+
+        delay = self._get_delay(attempt, err)
+        self._increment("retries")
+        logger.warning(
+            f"Retrying Stripe request in {delay:.2f}s (attempt {attempt + 1}): {err}"
+        )
+
+        return delay
+
+    def call(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        mutating: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Call ``func`` within the request budget, retrying transient errors.
+
+        :param func: The Stripe API method, e.g. ``stripe.Customer.create``.
+        :param mutating: Whether the call changes data on Stripe. Mutating
+            calls are sent with an idempotency key unless one is given.
+        """
+        if mutating:
+            kwargs.setdefault("idempotency_key", str(uuid.uuid4()))
+
+        attempt = 0
+
+        while True:
+            self._record_request(self.bucket.acquire())
+
+            try:
+                result = func(*args, **kwargs)
+            except stripe.error.StripeError as err:
+                time.sleep(self._get_retry_delay(attempt, err))
+                attempt += 1
+                continue
+
+            self._speed_up()
+            return result
+
+    async def acall(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        mutating: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Async version of ``call`` for the ``*_async`` Stripe methods. Waits
+        with ``asyncio.sleep`` so the event loop keeps serving other requests.
+        """
+        if mutating:
+            kwargs.setdefault("idempotency_key", str(uuid.uuid4()))
+
+        attempt = 0
+
+        while True:
+            waited = self.bucket.reserve()
+            if waited:
+                await asyncio.sleep(waited)
+            self._record_request(waited)
+
+            try:
+                result = await func(*args, **kwargs)
+            except stripe.error.StripeError as err:
+                await asyncio.sleep(self._get_retry_delay(attempt, err))
+                attempt += 1
+                continue
+
+            self._speed_up()
+            return result
+
+
+_default_scheduler: StripeRequestScheduler | None = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler() -> StripeRequestScheduler:
+    """
+    Return the scheduler shared by every payment gateway in this process.
+    """
+    global _default_scheduler
+
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = StripeRequestScheduler(
+                requests_per_second=getattr(settings, "STRIPE_REQUESTS_PER_SECOND", 25),
+                max_retries=getattr(settings, "STRIPE_MAX_RETRIES", 4),
+            )
+
+        return _default_scheduler
@@ -1,5 +1,407 @@
-from django.test import TestCase
+import json
+import time
+from io import StringIO
+from unittest.mock import Mock, patch
+
+import stripe
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from innovatix.core.models import ProcessedEvent, WebhookEvent
+from innovatix.core.paginator import EstimatedCountPaginator
+from innovatix.core.resolvers import CachedResolver
+from innovatix.core.services import payment_gateway as core_payment_gateway
+from innovatix.core.services.fetcher import ConcurrentFetcher
+from innovatix.core.services.http_client import PooledHTTPClient
+from innovatix.core.services.payment_gateways import CoreStripePaymentGateway
+from innovatix.core.services.rate_limiter import TokenBucket
+from innovatix.core.services.request_scheduler import StripeRequestScheduler
+from innovatix.core.views import StripeWebhookView
+from innovatix.core.webhooks import WebhookProcessor, enqueue_event, webhook_registry
+from innovatix.geo_territories.models import Country
 
 
 class BaseTestCase(TestCase):
     fixtures = ["initial.json"]
+
+
+def fake_stripe_resource(pages: list[list[dict]]) -> Mock:
+    responses = [
+        {"data": page, "has_more": index < len(pages) - 1}
+        for index, page in enumerate(pages)
+    ]
+    return Mock(list=Mock(side_effect=responses))
+
+
+class CoreStripePaymentGatewayTest(SimpleTestCase):
+    def setUp(self):
+        self.payment_gateway = CoreStripePaymentGateway("sk_test")
+        self.payment_gateway.stripe = Mock()
+        self.payment_gateway.stripe.Customer = fake_stripe_resource(
+            [[{"id": "cus_1"}, {"id": "cus_2"}], [{"id": "cus_3"}]]
+        )
+
+    def test_iter_all_yields_every_page(self):
+        customers = self.payment_gateway.iter_all("Customer", limit=2)
+
+        self.assertEqual(
+            [customer["id"] for customer in customers], ["cus_1", "cus_2", "cus_3"]
+        )
+        self.payment_gateway.stripe.Customer.list.assert_called_with(
+            starting_after="cus_2", limit=2
+        )
+
+    def test_iter_all_without_prefetch(self):
+        customers = self.payment_gateway.iter_all("Customer", prefetch=0, limit=2)
+
+        self.assertEqual(next(customers)["id"], "cus_1")
+        self.assertEqual(self.payment_gateway.stripe.Customer.list.call_count, 1)
+
+    def test_fetch_all_first_page_only(self):
+        customers = self.payment_gateway.fetch_all("Customer", all=False, limit=2)
+
+        self.assertEqual(len(customers), 2)
+
+    @patch("stripe.default_http_client", None)
+    def test_installs_pooled_http_client(self):
+        http_client = PooledHTTPClient(pool_size=4)
+        payment_gateway = CoreStripePaymentGateway("sk_test", http_client=http_client)
+
+        self.assertIs(stripe.default_http_client, http_client)
+        self.assertEqual(
+            payment_gateway.stats()["http_pool"],
+            {"pool_size": 4, "requests": 0, "connections": 0, "idle": 0},
+        )
+        self.assertEqual(
+            http_client._session.get_adapter("https://api.stripe.com"),
+            http_client.adapter,
+        )
+
+
+class ConcurrentFetcherTest(SimpleTestCase):
+    def setUp(self):
+        self.payment_gateway = CoreStripePaymentGateway("sk_test")
+        self.payment_gateway.stripe = Mock()
+        self.payment_gateway.stripe.Customer = fake_stripe_resource(
+            [[{"id": "cus_1"}], [{"id": "cus_2"}]]
+        )
+        self.payment_gateway.stripe.Invoice = fake_stripe_resource(
+            [[{"id": "in_1"}, {"id": "in_2"}]]
+        )
+
+    def test_submit_streams_in_parallel(self):
+        with ConcurrentFetcher(
+            self.payment_gateway, requests_per_second=100
+        ) as fetcher:
+            customers = fetcher.submit("Customer", limit=1)
+            invoices = fetcher.submit("Invoice", limit=2)
+
+            self.assertEqual([item["id"] for item in invoices], ["in_1", "in_2"])
+            self.assertEqual([item["id"] for item in customers], ["cus_1", "cus_2"])
+
+
+class TokenBucketTest(SimpleTestCase):
+    def test_acquire_waits_when_empty(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertGreater(bucket.acquire(), 0)
+
+
+@patch("innovatix.core.services.request_scheduler.time.sleep")
+class StripeRequestSchedulerTest(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = StripeRequestScheduler(requests_per_second=1000)
+
+    def test_retries_rate_limited_calls_with_same_idempotency_key(self, sleep):
+        func = Mock(
+            side_effect=[
+                stripe.error.RateLimitError(
+                    "Too many requests", http_status=429, headers={"Retry-After": "2"}
+                ),
+                {"id": "cus_1"},
+            ]
+        )
+
+        result = self.scheduler.call(func, mutating=True, email="a@example.com")
+
+        self.assertEqual(result, {"id": "cus_1"})
+        self.assertEqual(func.call_count, 2)
+        first_key = func.call_args_list[0].kwargs["idempotency_key"]
+        self.assertEqual(func.call_args_list[1].kwargs["idempotency_key"], first_key)
+        self.assertGreaterEqual(sleep.call_args.args[0], 2)
+
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["retries"], 1)
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertLess(stats["requests_per_second"], 1000)
+
+    def test_does_not_retry_client_errors(self, sleep):
+        func = Mock(
+            side_effect=stripe.error.InvalidRequestError("No such customer", None)
+        )
+
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            self.scheduler.call(func)
+
+        self.assertEqual(func.call_count, 1)
+        self.assertNotIn("idempotency_key", func.call_args.kwargs)
+        self.assertEqual(self.scheduler.stats()["failures"], 1)
+
+
+def make_event(event_id: str, object_id: str, created: int, type="test.event"):
+    return {
+        "id": event_id,
+        "object": "event",
+        "type": type,
+        "created": created,
+        "data": {"object": {"id": object_id, "object": "customer"}},
+    }
+
+
+class WebhookInboxTest(TestCase):
+    def setUp(self):
+        self.handler = Mock()
+        patcher = patch.dict(webhook_registry._handlers, {"test.event": [self.handler]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.processor = WebhookProcessor(workers=1, max_attempts=2)
+
+    def post_webhook(self, payload: str, secret: str = "whsec_test"):
+        timestamp = int(time.time())
+        signature = stripe.WebhookSignature._compute_signature(
+            f"{timestamp}.{payload}", secret
+        )
+        request = RequestFactory().post(
+            "/stripe/webhook/",
+            payload,
+            content_type="application/json",
+            headers={"Stripe-Signature": f"t={timestamp},v1={signature}"},
+        )
+
+        with patch.object(core_payment_gateway, "webhook_secret", "whsec_test"):
+            return StripeWebhookView.as_view()(request)
+
+    def test_view_stores_event_once(self):
+        payload = json.dumps(make_event("evt_1", "cus_1", 100))
+
+        for _ in range(2):
+            self.assertEqual(self.post_webhook(payload).status_code, 200)
+
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.handler.assert_not_called()
+
+    def test_view_rejects_invalid_signature(self):
+        payload = json.dumps(make_event("evt_1", "cus_1", 100))
+
+        response = self.post_webhook(payload, secret="whsec_other")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_registry_records_timings(self):
+        enqueue_event(make_event("evt_1", "cus_1", 100))
+        self.processor.run(once=True)
+
+        timing = webhook_registry.stats()["test.event"]
+        self.assertGreaterEqual(timing["count"], 1)
+        self.assertGreaterEqual(timing["total_seconds"], timing["max_seconds"])
+
+    def test_events_of_an_object_are_handled_in_order(self):
+        enqueue_event(make_event("evt_2", "cus_1", 200))
+        enqueue_event(make_event("evt_1", "cus_1", 100))
+        enqueue_event(make_event("evt_3", "cus_2", 150))
+
+        self.assertEqual(
+            [event.event_id for event in self.processor.claim()], ["evt_1", "evt_3"]
+        )
+        self.assertEqual(self.processor.claim(), [])
+
+    def test_failed_events_are_retried_then_dead_lettered(self):
+        self.handler.side_effect = Exception("Boom")
+        enqueue_event(make_event("evt_1", "cus_1", 100))
+        enqueue_event(make_event("evt_2", "cus_1", 200))
+
+        self.assertEqual(self.processor.run(once=True), 1)
+        webhook_event = WebhookEvent.objects.get(event_id="evt_1")
+        self.assertEqual(webhook_event.status, WebhookEvent.PENDING)
+        self.assertEqual(webhook_event.last_error, "Boom")
+
+        # The retry is not due yet, and it holds back the later event.
+        self.assertEqual(self.processor.claim(), [])
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.processor.run(once=True)
+
+        self.assertEqual(
+            WebhookEvent.objects.get(event_id="evt_1").status, WebhookEvent.DEAD
+        )
+        # Once evt_1 is dead-lettered, evt_2 is no longer held back.
+        self.assertEqual(WebhookEvent.objects.get(event_id="evt_2").attempts, 1)
+        self.assertEqual(self.handler.call_count, 3)
+
+    def test_redelivered_event_short_circuits(self):
+        enqueue_event(make_event("evt_1", "cus_1", 100))
+        self.processor.run(once=True)
+        WebhookEvent.objects.all().delete()
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(enqueue_event(make_event("evt_1", "cus_1", 100)))
+
+        self.assertEqual(ProcessedEvent.objects.get().object_id, "cus_1")
+        self.assertEqual(self.handler.call_count, 1)
+
+    def test_out_of_order_event_is_skipped(self):
+        enqueue_event(make_event("evt_2", "cus_1", 200))
+        self.processor.run(once=True)
+        enqueue_event(make_event("evt_1", "cus_1", 100))
+        self.processor.run(once=True)
+
+        self.assertEqual(
+            WebhookEvent.objects.get(event_id="evt_1").status, WebhookEvent.SKIPPED
+        )
+        self.assertEqual(self.handler.call_count, 1)
+
+
+@patch("innovatix.core.management.commands.replay_stripe_events.payment_gateway")
+class ReplayStripeEventsTest(TestCase):
+    def setUp(self):
+        self.handler = Mock()
+        patcher = patch.dict(webhook_registry._handlers, {"test.event": [self.handler]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Stripe lists events newest first.
+        self.stripe_events = [
+            stripe.Event.construct_from(event, "sk_test")
+            for event in [
+                make_event("evt_3", "cus_1", 300),
+                make_event("evt_2", "cus_2", 200),
+                make_event("evt_1", "cus_1", 100),
+                make_event("evt_0", "cus_1", 50, type="unhandled.event"),
+            ]
+        ]
+
+    def replay(self, *args):
+        stdout = StringIO()
+        call_command(
+            "replay_stripe_events", "--hours=2", "--workers=1", *args, stdout=stdout
+        )
+        return stdout.getvalue()
+
+    def test_replays_events_in_order(self, payment_gateway):
+        payment_gateway.iter_all.return_value = iter(self.stripe_events)
+
+        output = self.replay()
+
+        self.assertIn("Replayed 3 events: 3 done", output)
+        self.assertEqual(
+            [call.args[0].id for call in self.handler.call_args_list],
+            ["evt_1", "evt_2", "evt_3"],
+        )
+        self.assertEqual(payment_gateway.iter_all.call_args.args, ("Event",))
+
+    def test_replays_dead_events(self, payment_gateway):
+        payment_gateway.iter_all.return_value = iter(self.stripe_events)
+        enqueue_event(make_event("evt_2", "cus_2", 200))
+        WebhookEvent.objects.filter(event_id="evt_2").update(
+            status=WebhookEvent.DEAD, attempts=5
+        )
+
+        output = self.replay()
+
+        self.assertIn("Queued 2 events, retrying 1 events already in the inbox", output)
+        self.assertIn("Replayed 3 events: 3 done", output)
+        webhook_event = WebhookEvent.objects.get(event_id="evt_2")
+        self.assertEqual(webhook_event.status, WebhookEvent.DONE)
+        self.assertEqual(webhook_event.attempts, 1)
+
+    def test_dry_run(self, payment_gateway):
+        payment_gateway.iter_all.return_value = iter(self.stripe_events)
+        ProcessedEvent.objects.create(event_id="evt_1", processed=True)
+
+        output = self.replay("--dry-run")
+
+        self.assertIn("Would replay 2 events, 1 were already processed", output)
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.handler.assert_not_called()
+
+
+class CachedResolverTest(BaseTestCase):
+    def setUp(self):
+        self.resolver = CachedResolver(Country, "code", maxsize=2)
+
+    def test_repeated_lookups_hit_the_cache(self):
+        with self.assertNumQueries(1):
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.resolver.get("US")
+            second = self.resolver.get("US")
+
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.resolver.stats(), {"size": 1, "hits": 1, "misses": 1})
+
+    def test_misses_raise_and_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(Country.DoesNotExist), self.assertNumQueries(1):
+                self.resolver.get("XX")
+
+    def test_saving_evicts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            country = self.resolver.get("US")
+        country.name = "Renamed"
+        country.save()
+
+        self.assertEqual(self.resolver.get("US").name, "Renamed")
+        self.assertEqual(self.resolver.stats()["hits"], 0)
+
+    def test_changing_the_key_evicts_the_old_one(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            country = self.resolver.get("US")
+        country.code = "UX"
+        country.save()
+
+        with self.assertRaises(Country.DoesNotExist):
+            self.resolver.get("US")
+        self.assertEqual(self.resolver.stats()["size"], 0)
+
+    def test_rows_are_cached_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.resolver.get("US")
+
+        # The transaction is rolled back: the row must not be cached.
+        self.assertEqual(self.resolver.stats()["size"], 0)
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(self.resolver.stats()["size"], 1)
+
+    def test_least_recently_used_rows_are_dropped(self):
+        Country.objects.create(name="Canada", code="CA")
+        Country.objects.create(name="Mexico", code="MX")
+
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            countries = self.resolver.get_many(["US", "CA", "MX"])
+
+        self.assertEqual(set(countries), {"US", "CA", "MX"})
+        self.assertEqual(self.resolver.stats()["size"], 2)
+
+
+class EstimatedCountPaginatorTest(BaseTestCase):
+    def test_uses_estimate_for_large_tables(self):
+        paginator = EstimatedCountPaginator(Country.objects.order_by("pk"), 100)
+
+        with patch.object(paginator, "get_estimated_count", return_value=50_000):
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 50_000)
+
+    def test_counts_filtered_querysets(self):
+        paginator = EstimatedCountPaginator(
+            Country.objects.filter(code="US").order_by("pk"), 100
+        )
+
+        self.assertIsNone(paginator.get_estimated_count())
+        self.assertEqual(paginator.count, 1)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from innovatix.core.views import StripeWebhookView
+
+app_name = "core"
+
+urlpatterns = [
+    path("stripe/webhook/", StripeWebhookView.as_view(), name="stripe-webhook"),
+]
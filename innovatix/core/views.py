@@ -1,7 +1,18 @@
+import logging
+
 from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import DetailView, ListView, TemplateView
 from django.views.generic.edit import FormView
 
+from innovatix.core.services import payment_gateway
+from innovatix.core.webhooks import enqueue_event
+
+logger = logging.getLogger("django")
+
 
 class URLNameContextMixin:
     """
@@ -37,3 +48,38 @@ class CoreFormView(URLNameContextMixin, FormView):
 
 class CoreDetailView(URLNameContextMixin, DetailView):
     pass
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class StripeWebhookView(View):
+    """
+    Verify incoming Stripe events, store them in the webhook inbox and answer
+    right away.
+
+    The payload is decoded once, after its ``Stripe-Signature`` is checked.
+    The events are handled by the ``process_webhook_events`` workers, which
+    dispatch them through ``webhook_registry``, so a slow handler never makes
+    Stripe time out and redeliver.
+    """
+
+    http_method_names = ["post"]
+
+    def post(self, request: HttpRequest) -> HttpResponse:
+        try:
+            event = payment_gateway.parse_webhook(
+                request.body, request.headers.get("Stripe-Signature")
+            )
+        except payment_gateway.stripe.error.SignatureVerificationError as err:
+            logger.warning(f"Invalid Stripe webhook signature: {err}")
+            return HttpResponseBadRequest()
+        except ValueError as err:
+            logger.warning(f"Invalid Stripe webhook payload: {err}")
+            return HttpResponseBadRequest()
+
+        try:
+            enqueue_event(event)
+        except (KeyError, TypeError) as err:
+            logger.warning(f"Invalid Stripe webhook payload: {err}")
+            return HttpResponseBadRequest()
+
+        return HttpResponse(status=200)
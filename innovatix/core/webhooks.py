@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Callable
+
+import stripe
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from innovatix.core.models import ProcessedEvent, WebhookEvent
+
+logger = logging.getLogger("django")
+
+WebhookHandler = Callable[[stripe.Event], Any]
+
+
+class WebhookRegistry:
+    """
+    Map Stripe event types to their handlers.
+
+    Handlers of the same type run in registration order; apps register theirs
+    from ``AppConfig.ready``. ``dispatch`` times every event, and ``stats``
+    returns the count, errors and total/max seconds per event type.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, list[WebhookHandler]] = {}
+        self._timings: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self, event_type: str, handler: WebhookHandler | None = None
+    ) -> WebhookHandler | Callable[[WebhookHandler], WebhookHandler]:
+        """
+        Run ``handler`` for every Stripe event of ``event_type``. Can also be
+        used as a decorator.
+        """
+        if handler is None:
+            return lambda handler: self.register(event_type, handler)
+
+        handlers = self._handlers.setdefault(event_type, [])
+
+        if handler not in handlers:
+            handlers.append(handler)
+
+        return handler
+
+    def get_handlers(self, event_type: str) -> list[WebhookHandler]:
+        return self._handlers.get(event_type, [])
+
+    def _record(self, event_type: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(
+                event_type,
+                {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+            )
+            timing["count"] += 1
+            timing["errors"] += failed
+            timing["total_seconds"] += seconds
+            timing["max_seconds"] = max(timing["max_seconds"], seconds)
+
+    def dispatch(self, event: stripe.Event) -> None:
+        """
+        Run the handlers of ``event``, re-raising the first error.
+        """
+        started_at = time.perf_counter()
+        failed = True
+
+        try:
+            for handler in self.get_handlers(event.type):
+                handler(event)
+            failed = False
+        finally:
+            self._record(event.type, time.perf_counter() - started_at, failed)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                event_type: {**timing} for event_type, timing in self._timings.items()
+            }
+
+
+webhook_registry = WebhookRegistry()
+register_webhook_handler = webhook_registry.register
+get_webhook_handlers = webhook_registry.get_handlers
+
+
+def enqueue_event(event: dict[str, Any]) -> WebhookEvent | None:
+    """
+    Store a Stripe event in the inbox for the workers to handle.
+
+    :param event: The decoded event payload.
+    :return: The inbox entry, or ``None`` if nothing handles the event type
+        or the event was already received.
+    """
+    if not get_webhook_handlers(event["type"]):
+        logger.debug(f"Ignoring unhandled Stripe event {event['type']}")
+        return None
+
+    # Redeliveries of handled events stop at this single index lookup.
+    if ProcessedEvent.is_processed(event["id"]):
+        return None
+
+    webhook_event, created = WebhookEvent.objects.get_or_create(
+        event_id=event["id"],
+        defaults={
+            "event_type": event["type"],
+            "object_id": event["data"]["object"].get("id") or "",
+            "created": event["created"],
+            "payload": event,
+        },
+    )
+
+    return webhook_event if created else None
+
+
+class WebhookProcessor:
+    """
+    Drain the webhook inbox with a pool of worker threads.
+
+    Each claim takes due events in ``created`` order, at most one per Stripe
+    object, and skips objects that still have an older event pending or one
+    being processed, so the events of an object are always handled in order.
+    Failed events are retried with exponential backoff and marked ``DEAD``
+    after ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        batch_size: int = 20,
+        max_attempts: int | None = None,
+        base_delay: float = 30,
+        max_delay: float = 60 * 60,
+        lock_timeout: float = 10 * 60,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts or getattr(settings, "WEBHOOK_MAX_ATTEMPTS", 8)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock_timeout = lock_timeout
+
+    def release_stale(self) -> int:
+        """
+        Put back events whose worker died while processing them.
+        """
+        return WebhookEvent.objects.filter(
+            status=WebhookEvent.PROCESSING,
+            locked_at__lt=timezone.now() - timedelta(seconds=self.lock_timeout),
+        ).update(status=WebhookEvent.PENDING, locked_at=None)
+
+    def claim(self) -> list[WebhookEvent]:
+        now = timezone.now()
+        blocking = (
+            WebhookEvent.objects.filter(object_id=OuterRef("object_id"))
+            .exclude(object_id="")
+            .exclude(pk=OuterRef("pk"))
+            .filter(
+                Q(status=WebhookEvent.PROCESSING)
+                | Q(status=WebhookEvent.PENDING, created__lt=OuterRef("created"))
+                | Q(
+                    status=WebhookEvent.PENDING,
+                    created=OuterRef("created"),
+                    pk__lt=OuterRef("pk"),
+                )
+            )
+        )
+
+        with transaction.atomic():
+            candidates = (
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(status=WebhookEvent.PENDING, next_attempt_at__lte=now)
+                .filter(~Exists(blocking))
+                .order_by("created", "pk")[: self.batch_size]
+            )
+            claimed, object_ids = [], set()
+
+            for webhook_event in candidates:
+                if webhook_event.object_id in object_ids:
+                    continue
+                if webhook_event.object_id:
+                    object_ids.add(webhook_event.object_id)
+                claimed.append(webhook_event)
+
+            WebhookEvent.objects.filter(pk__in=[event.pk for event in claimed]).update(
+                status=WebhookEvent.PROCESSING,
+                locked_at=now,
+                attempts=F("attempts") + 1,
+            )
+
+        for webhook_event in claimed:
+            webhook_event.attempts += 1
+
+        return claimed
+
+    def get_retry_delay(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def process(self, webhook_event: WebhookEvent) -> bool:
+        """
+        Run the handlers of one claimed event.
+
+        Events that were already handled, or that are older than the last
+        handled event of the same Stripe object, are skipped without running
+        any handler. Otherwise the handlers and the ``ProcessedEvent`` record
+        are committed together, so a retried event never applies twice.
+
+        :return: Whether the event was handled (or skipped) successfully.
+        """
+        if ProcessedEvent.is_processed(webhook_event.event_id):
+            self.finish(webhook_event, WebhookEvent.SKIPPED, "Already processed")
+            return True
+
+        if ProcessedEvent.is_stale(webhook_event.object_id, webhook_event.created):
+            self.finish(
+                webhook_event,
+                WebhookEvent.SKIPPED,
+                "A newer event of this object was already processed",
+            )
+            return True
+
+        event = stripe.Event.construct_from(webhook_event.payload, stripe.api_key)
+
+        try:
+            with transaction.atomic():
+                webhook_registry.dispatch(event)
+
+                ProcessedEvent.objects.create(
+                    event_id=webhook_event.event_id,
+                    event_type=webhook_event.event_type,
+                    object_id=webhook_event.object_id,
+                    created=webhook_event.created,
+                    processed=True,
+                )
+        except Exception as err:
+            self.fail(webhook_event, err)
+            return False
+
+        self.finish(webhook_event, WebhookEvent.DONE)
+        return True
+
+    def finish(self, webhook_event: WebhookEvent, status: str, note: str = "") -> None:
+        WebhookEvent.objects.filter(pk=webhook_event.pk).update(
+            status=status,
+            locked_at=None,
+            processed_at=timezone.now(),
+            last_error=note,
+        )
+
+    def fail(self, webhook_event: WebhookEvent, err: Exception) -> None:
+        if webhook_event.attempts >= self.max_attempts:
+            logger.error(
+                f"Giving up on Stripe event {webhook_event.event_id} after "
+                f"{webhook_event.attempts} attempts: {err}"
+            )
+            WebhookEvent.objects.filter(pk=webhook_event.pk).update(
+                status=WebhookEvent.DEAD, locked_at=None, last_error=str(err)
+            )
+            return
+
+        delay = self.get_retry_delay(webhook_event.attempts)
+        logger.warning(
+            f"Retrying Stripe event {webhook_event.event_id} in {delay:.0f}s: {err}"
+        )
+        WebhookEvent.objects.filter(pk=webhook_event.pk).update(
+            status=WebhookEvent.PENDING,
+            locked_at=None,
+            last_error=str(err),
+            next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    def _process_in_thread(self, webhook_event: WebhookEvent) -> bool:
+        close_old_connections()
+        try:
+            return self.process(webhook_event)
+        finally:
+            close_old_connections()
+
+    def run_once(self, executor: ThreadPoolExecutor | None = None) -> int:
+        """
+        Claim and handle one batch of events.
+
+        :return: The number of events claimed.
+        """
+        claimed = self.claim()
+
+        if executor is None:
+            for webhook_event in claimed:
+                self.process(webhook_event)
+        else:
+            list(executor.map(self._process_in_thread, claimed))
+
+        return len(claimed)
+
+    def run(
+        self,
+        poll_interval: float = 1,
+        stop: threading.Event | None = None,
+        once: bool = False,
+    ) -> int:
+        """
+        Keep draining the inbox until ``stop`` is set, or until no event is
+        due when ``once`` is given.
+
+        :return: The number of events claimed.
+        """
+        stop = stop or threading.Event()
+        executor = (
+            ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        )
+        total = 0
+
+        try:
+            while not stop.is_set():
+                self.release_stale()
+                claimed = self.run_once(executor)
+                total += claimed
+
+                if not claimed:
+                    if once:
+                        break
+                    stop.wait(poll_interval)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+        return total
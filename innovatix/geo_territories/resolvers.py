@@ -0,0 +1,6 @@
+from innovatix.core.resolvers import CachedResolver
+from innovatix.geo_territories.models import Country, Province
+
+# Countries and provinces are reference data that barely change.
+country_resolver = CachedResolver(Country, "code", ttl=60 * 60)
+province_resolver = CachedResolver(Province, ("code", "country_id"), ttl=60 * 60)
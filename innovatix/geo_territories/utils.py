@@ -6,6 +6,7 @@ from innovatix.geo_territories.constants import (
     DEFAULT_PROVINCE_CODE,
 )
 from innovatix.geo_territories.models import Country, Province
+from innovatix.geo_territories.resolvers import country_resolver, province_resolver
 
 logger = logging.getLogger("django")
 
@@ -26,7 +27,7 @@ def create_province(country: Country, **kwargs: dict[str, Any]) -> Province:
 
 def get_default_country() -> Country:
     try:
-        return Country.objects.get(code=DEFAULT_COUNTRY_CODE)
+        return country_resolver.get(DEFAULT_COUNTRY_CODE)
     except Country.DoesNotExist as err:
         logger.error(f"Fetching the default country from the DB: {err}")
         raise Country.DoesNotExist
@@ -34,9 +35,7 @@ def get_default_country() -> Country:
 
 def get_default_province() -> Province:
     try:
-        return Province.objects.get(
-            code=DEFAULT_PROVINCE_CODE, country=get_default_country()
-        )
+        return province_resolver.get(DEFAULT_PROVINCE_CODE, get_default_country().pk)
     except Province.DoesNotExist as err:
         logger.error(f"Fetching the default country from the DB: {err}")
         raise Province.DoesNotExist
@@ -48,6 +48,20 @@ class TagAdmin(admin.ModelAdmin):
     search_fields = ["text"]
 
 
+class ActiveSubscriptionFilter(admin.SimpleListFilter):
+    title = _("active subscription")
+    parameter_name = "has_active_subscription"
+
+    def lookups(self, request, model_admin):
+        return [("yes", _("Yes")), ("no", _("No"))]
+
+    def queryset(self, request, queryset):
+        if self.value() in ("yes", "no"):
+            return queryset.filter(has_active_subscription=self.value() == "yes")
+
+        return queryset
+
+
 @admin.register(CustomerUser)
 class CustomerUserAdmin(UserAdmin):
     inlines = (
@@ -148,11 +162,13 @@ class CustomerUserAdmin(UserAdmin):
         "email",
         "display_full_name",
         "date_joined",
+        "display_has_active_subscription",
         "is_staff",
         "is_active",
     )
     list_filter = (
         "is_active",
+        ActiveSubscriptionFilter,
         "date_joined",
     )
     search_fields = ("email", "first_name", "last_name")
@@ -166,7 +182,7 @@ class CustomerUserAdmin(UserAdmin):
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        queryset = queryset.annotate(
+        queryset = queryset.with_active_subscription_flag().annotate(
             full_name=Concat(
                 "first_name", Value(" "), "last_name", output_field=CharField()
             )
@@ -177,6 +193,14 @@ class CustomerUserAdmin(UserAdmin):
     def display_full_name(self, obj: CustomerUser):
         return obj.get_full_name()
 
+    @admin.display(
+        description="Active subscription",
+        boolean=True,
+        ordering="has_active_subscription",
+    )
+    def display_has_active_subscription(self, obj: CustomerUser):
+        return obj.has_active_subscriptions()
+
     def get_readonly_fields(
         self, request: HttpRequest, obj: CustomerUser | None = None
     ) -> list[str]:
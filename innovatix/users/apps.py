@@ -6,3 +6,15 @@ class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "innovatix.users"
     verbose_name = _("Users")
+
+    def ready(self):
+        from innovatix.core.webhooks import register_webhook_handler
+        from innovatix.users import webhook
+
+        register_webhook_handler(
+            "customer.created", webhook.handle_customer_update_or_creation
+        )
+        register_webhook_handler(
+            "customer.updated", webhook.handle_customer_update_or_creation
+        )
+        register_webhook_handler("customer.deleted", webhook.handle_customer_deletion)
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def unlink_duplicate_customers(apps, schema_editor):
+    """
+    Keep the Stripe ID on the oldest customer sharing it and clear it on the
+    others. Customers own subscriptions and payment methods, so they are not
+    merged or deleted automatically.
+    """
+    CustomerUser = apps.get_model('users', 'CustomerUser')
+    duplicated = (
+        CustomerUser.objects.exclude(external_customer_id='')
+        .values('external_customer_id')
+        .annotate(count=Count('pk'))
+        .filter(count__gt=1)
+        .values_list('external_customer_id', flat=True)
+    )
+
+    for external_customer_id in list(duplicated):
+        keep = CustomerUser.objects.filter(external_customer_id=external_customer_id).order_by('pk').first()
+        CustomerUser.objects.filter(external_customer_id=external_customer_id).exclude(pk=keep.pk).update(external_customer_id='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_alter_customeruser_country_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(unlink_duplicate_customers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_deduplicate_external_customer_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customeruser',
+            name='external_customer_id',
+            field=models.CharField(blank=True, db_index=True, max_length=50, verbose_name='ID de Stripe'),
+        ),
+        migrations.AddConstraint(
+            model_name='customeruser',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_customer_id', ''), _negated=True), fields=('external_customer_id',), name='unique_external_customer_id'),
+        ),
+    ]
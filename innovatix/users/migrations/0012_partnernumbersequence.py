@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_customeruser_unique_external_customer_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartnerNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=7, unique=True, verbose_name='periodo')),
+                ('last_value', models.PositiveIntegerField(default=0, verbose_name='último número')),
+            ],
+            options={
+                'verbose_name': 'partner number sequence',
+                'verbose_name_plural': 'partner number sequences',
+            },
+        ),
+    ]
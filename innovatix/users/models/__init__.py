@@ -1,4 +1,5 @@
 from .company import Company
 from .contact import ContactModel
 from .customer_user import CustomerUser
+from .partner_number_sequence import PartnerNumberSequence
 from .tag import Tag
@@ -1,10 +1,11 @@
 from typing import Any
 
 from allauth.account.models import EmailAddress
+from django.apps import apps
 from django.contrib.auth.models import PermissionsMixin
 from django.core.validators import RegexValidator
 from django.db import models
-from django.utils import timezone
+from django.db.models import Exists, OuterRef
 from django.utils.translation import gettext_lazy as _
 
 from innovatix.geo_territories.constants import DEFAULT_COUNTRY_CODE
@@ -13,9 +14,25 @@ from innovatix.users.constants import LANGUAGE_CHOICES
 
 from .base_user import BaseUser, BaseUserManager
 from .company import Company
+from .partner_number_sequence import PartnerNumberSequence
 
 
-class CustomerUserManager(BaseUserManager):
+class CustomerUserQuerySet(models.QuerySet):
+    def with_active_subscription_flag(self) -> "CustomerUserQuerySet":
+        """
+        Annotate ``has_active_subscription`` with an ``EXISTS`` subquery, so
+        customers can be listed, filtered and sorted by it in one query.
+        """
+        UserMembership = apps.get_model("products", "UserMembership")
+
+        return self.annotate(
+            has_active_subscription=Exists(
+                UserMembership.objects.filter(user=OuterRef("pk"), status="active")
+            )
+        )
+
+
+class CustomerUserManager(BaseUserManager.from_queryset(CustomerUserQuerySet)):
     """
     Custom manager for CustomerUser model.
     """
@@ -90,7 +107,7 @@ class CustomerUser(BaseUser, PermissionsMixin):
     """
 
     external_customer_id = models.CharField(
-        _("ID de Stripe"), max_length=50, blank=True
+        _("ID de Stripe"), max_length=50, blank=True, db_index=True
     )
     partner_number = models.CharField(
         _("número de socio"),
@@ -174,28 +191,27 @@ class CustomerUser(BaseUser, PermissionsMixin):
     class Meta:
         verbose_name = _("customer")
         verbose_name_plural = _("customers")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["external_customer_id"],
+                condition=~models.Q(external_customer_id=""),
+                name="unique_external_customer_id",
+            ),
+        ]
 
     def has_active_subscriptions(self) -> bool:
-        return self.subscriptions.filter(status="active").count() >= 1
+        # Customers from with_active_subscription_flag() already know it.
+        if hasattr(self, "has_active_subscription"):
+            return self.has_active_subscription
+
+        return self.usermembership_set.filter(status="active").exists()
 
     def format_phone_number(self):
         country_code = getattr(self.country, "code", DEFAULT_COUNTRY_CODE)
         return super().format_phone_number(country_code)
 
-    def generate_partner_number(self):
-        current_date = timezone.now()
-
-        # Get the number of CustomerUser instances that were created this month
-        # This uses the __year and __month field lookups to filter instances
-        # based on the year and month of the date_joined field
-        count = CustomerUser.objects.filter(
-            date_joined__year=current_date.year,
-            date_joined__month=current_date.month,
-        ).count()
-
-        # Generate the partner_number using the year, month, and count
-        # We use str.zfill to pad the count with leading zeros
-        return f"{current_date.year}-{str(current_date.month).zfill(2)}-{str(count + 1).zfill(4)}"
+    def generate_partner_number(self) -> str:
+        return PartnerNumberSequence.objects.reserve()[0]
 
     def save(self, *args: Any, **kwargs: dict[str, Any]):
         # Only set the partner_number and password if this instance is being created
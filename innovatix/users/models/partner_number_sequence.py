@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class PartnerNumberSequenceManager(models.Manager):
+    def reserve(self, count: int = 1, date: datetime | None = None) -> list[str]:
+        """
+        Reserve ``count`` consecutive partner numbers of the month of ``date``.
+
+        The month's counter is locked with ``SELECT ... FOR UPDATE`` and bumped
+        once, so concurrent signups never get the same number and a bulk import
+        gets its whole block from a single allocation.
+
+        :param date: Defaults to now.
+        """
+        if count < 1:
+            return []
+
+        date = date or timezone.now()
+        period = f"{date.year}-{str(date.month).zfill(2)}"
+
+        with transaction.atomic(using=self.db):
+            sequence, _ = self.select_for_update().get_or_create(
+                period=period, defaults={"last_value": self.get_last_issued(period)}
+            )
+            first = sequence.last_value + 1
+            sequence.last_value += count
+            sequence.save(update_fields=["last_value"])
+
+        return [
+            f"{period}-{str(value).zfill(4)}" for value in range(first, first + count)
+        ]
+
+    def get_last_issued(self, period: str) -> int:
+        """
+        Return the highest number already issued in ``period``, so the counter
+        of a month starts after the numbers given before it existed.
+        """
+        CustomerUser = apps.get_model("users", "CustomerUser")
+        last = CustomerUser.objects.filter(
+            partner_number__startswith=f"{period}-"
+        ).aggregate(last=Max("partner_number"))["last"]
+
+        return int(last.rsplit("-", 1)[1]) if last else 0
+
+
+class PartnerNumberSequence(models.Model):
+    """
+    The last partner number issued in each month.
+    """
+
+    period = models.CharField(_("periodo"), max_length=7, unique=True)
+    last_value = models.PositiveIntegerField(_("último número"), default=0)
+
+    objects = PartnerNumberSequenceManager()
+
+    class Meta:
+        verbose_name = _("partner number sequence")
+        verbose_name_plural = _("partner number sequences")
+
+    def __str__(self) -> str:
+        return f"{self.period}: {self.last_value}"
@@ -0,0 +1,4 @@
+from innovatix.core.resolvers import CachedResolver
+from innovatix.users.models import CustomerUser
+
+customer_resolver = CachedResolver(CustomerUser, "external_customer_id")
@@ -1,4 +1,7 @@
+from datetime import datetime
+
 from django.contrib.admin.models import LogEntry
+from django.db import IntegrityError, transaction
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils import timezone
@@ -6,12 +9,13 @@ from django.utils.translation import gettext as _
 from innovatix.core.tests import BaseTestCase
 from innovatix.geo_territories.utils import get_default_country, get_default_province
 from innovatix.users.forms import ContactForm
-from innovatix.users.models import ContactModel, CustomerUser
+from innovatix.users.models import ContactModel, CustomerUser, PartnerNumberSequence
 from innovatix.users.utils import (
     create_fake_company,
     create_fake_contact,
     create_fake_customer_user,
 )
+from products.utils import create_fake_membership, create_fake_subscription
 
 
 class CompanyModelTest(BaseTestCase):
@@ -195,3 +199,76 @@ class CustomerUserTest(BaseTestCase):
         )
         formatted_phone = user.format_phone_number()
         self.assertEqual(formatted_phone, "+1 650-253-2222")
+
+    def test_external_customer_id_is_unique_unless_blank(self):
+        create_fake_customer_user(
+            self.province, self.country, email="user2@example.com"
+        )
+        self.customer_user.external_customer_id = "cus_1"
+        self.customer_user.save()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            create_fake_customer_user(
+                self.province,
+                self.country,
+                email="user3@example.com",
+                external_customer_id="cus_1",
+            )
+
+    def test_reserve_partner_numbers(self):
+        current_date = timezone.now()
+        period = f"{current_date.year}-{str(current_date.month).zfill(2)}"
+
+        self.assertEqual(
+            PartnerNumberSequence.objects.reserve(2),
+            [f"{period}-0002", f"{period}-0003"],
+        )
+        user2 = create_fake_customer_user(
+            self.province, self.country, email="user2@example.com"
+        )
+        self.assertEqual(user2.partner_number, f"{period}-0004")
+
+    def test_partner_number_sequence_starts_after_issued_numbers(self):
+        PartnerNumberSequence.objects.all().delete()
+        CustomerUser.objects.filter(pk=self.customer_user.pk).update(
+            partner_number="2020-01-0041"
+        )
+
+        self.assertEqual(
+            PartnerNumberSequence.objects.reserve(date=datetime(2020, 1, 15)),
+            ["2020-01-0042"],
+        )
+
+    def test_has_active_subscriptions(self):
+        self.assertFalse(self.customer_user.has_active_subscriptions())
+
+        subscription = create_fake_subscription(
+            self.customer_user, create_fake_membership(), status="canceled"
+        )
+        self.assertFalse(self.customer_user.has_active_subscriptions())
+
+        subscription.status = "active"
+        subscription.save()
+        self.assertTrue(self.customer_user.has_active_subscriptions())
+
+    def test_with_active_subscription_flag(self):
+        user2 = create_fake_customer_user(
+            self.province, self.country, email="user2@example.com"
+        )
+        create_fake_subscription(user2, create_fake_membership())
+
+        with self.assertNumQueries(1):
+            flags = {
+                customer.pk: customer.has_active_subscriptions()
+                for customer in CustomerUser.objects.with_active_subscription_flag().filter(
+                    pk__in=[self.customer_user.pk, user2.pk]
+                )
+            }
+
+        self.assertEqual(flags, {self.customer_user.pk: False, user2.pk: True})
+        self.assertQuerySetEqual(
+            CustomerUser.objects.with_active_subscription_flag().filter(
+                has_active_subscription=True
+            ),
+            [user2],
+        )
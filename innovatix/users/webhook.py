@@ -4,7 +4,9 @@ from typing import Any
 import stripe
 from innovatix.core.utils import log_change, log_creation, log_deletion
 from innovatix.geo_territories.models import Country, Province
+from innovatix.geo_territories.resolvers import country_resolver, province_resolver
 from innovatix.users.models import CustomerUser
+from innovatix.users.resolvers import customer_resolver
 from innovatix.users.utils import create_or_update_customer_user
 
 logger = logging.getLogger("django")
@@ -12,14 +14,33 @@ logger = logging.getLogger("django")
 
 def get_sanitized_data(
     stripe_customer: stripe.Customer,
+    countries: dict[str, Country] | None = None,
+    provinces: dict[tuple[str, int], Province] | None = None,
 ) -> dict[str, Province | Country | str | Any | None]:
+    """
+    Map a Stripe customer to CustomerUser fields.
+
+    Bulk callers can pass ``countries`` (keyed by code) and ``provinces``
+    (keyed by code and country ID) to resolve the address from their own
+    maps; otherwise the shared resolvers are used.
+    """
     address = stripe_customer.address or {}
-    country = Country.objects.get(
-        code=getattr(stripe_customer.address, "country", "US")
-    )
-    state = Province.objects.get(
-        code=getattr(stripe_customer.address, "state", "PR"), country=country
-    )
+    country_code = getattr(stripe_customer.address, "country", "US")
+    state_code = getattr(stripe_customer.address, "state", "PR")
+
+    if countries is None:
+        country = country_resolver.get(country_code)
+    elif country_code in countries:
+        country = countries[country_code]
+    else:
+        raise Country.DoesNotExist(f"Country {country_code} does not exist.")
+
+    if provinces is None:
+        state = province_resolver.get(state_code, country.pk)
+    elif (state_code, country.pk) in provinces:
+        state = provinces[(state_code, country.pk)]
+    else:
+        raise Province.DoesNotExist(f"Province {state_code} does not exist.")
 
     try:
         first_name = getattr(
@@ -83,11 +104,13 @@ def handle_customer_deletion(event: stripe.Event):
     try:
         data = event.data.object
 
-        customer = CustomerUser.objects.filter(external_customer_id=data.id).first()
+        try:
+            customer = customer_resolver.get(data.id)
+        except CustomerUser.DoesNotExist:
+            return
 
-        if customer:
-            log_deletion(customer)
-            customer.delete()
+        log_deletion(customer)
+        customer.delete()
     except Exception as err:
         logger.error(f"Failed deleting CustomerUser from webhook: {err}")
         raise
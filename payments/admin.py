@@ -1,9 +1,11 @@
 from django.contrib import admin
+from django.db.models.query import QuerySet
 from django.http.request import HttpRequest
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from innovatix.core.paginator import EstimatedCountPaginator
 from payments.forms import PaymentForm, PaymentMethod
 from payments.models import Payment
 
@@ -65,6 +67,9 @@ class PaymentInline(admin.TabularInline):
     show_change_link = True
     model = Payment
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet[Payment]:
+        return super().get_queryset(request).select_related("payment_method")
+
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -108,6 +113,9 @@ class PaymentAdmin(admin.ModelAdmin):
         "status",
         "date",
     )
+    list_select_related = ("user_membership__user", "user_membership__membership")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     ordering = (
         "-date",
         "total",
@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        from innovatix.core.webhooks import register_webhook_handler
+        from payments import checks  # noqa: F401
+        from payments import webhook
+
+        # The payment method must exist before the payment that references it.
+        register_webhook_handler(
+            "payment_intent.succeeded", webhook.handle_payment_method_creation
+        )
+        register_webhook_handler(
+            "payment_intent.succeeded", webhook.handle_payment_creation
+        )
+
+        for event_type in ["invoice.paid", "invoice.payment_failed", "invoice.updated"]:
+            register_webhook_handler(event_type, webhook.handle_payment_update)
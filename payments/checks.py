@@ -0,0 +1,27 @@
+import stripe
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_async_checkout_client(app_configs, **kwargs):
+    """
+    The async checkout needs an async HTTP client for Stripe (httpx or aiohttp);
+    without one every checkout would fail at runtime.
+    """
+    if not getattr(settings, "ASYNC_CHECKOUT", False):
+        return []
+
+    if isinstance(
+        stripe.http_client.new_http_client_async_fallback(),
+        stripe.http_client.NoImportFoundAsyncClient,
+    ):
+        return [
+            Error(
+                "ASYNC_CHECKOUT is enabled but no async HTTP client is installed.",
+                hint='Install httpx, e.g. with pip install "innovatix-core[async]".',
+                id="payments.E001",
+            )
+        ]
+
+    return []
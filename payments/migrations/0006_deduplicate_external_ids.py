@@ -0,0 +1,50 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def get_duplicates(model, field):
+    """
+    Yield the oldest row and its duplicates for every Stripe ID used more
+    than once.
+    """
+    duplicated = (
+        model.objects.exclude(**{field: ''})
+        .values(field)
+        .annotate(count=Count('pk'))
+        .filter(count__gt=1)
+        .values_list(field, flat=True)
+    )
+
+    for value in list(duplicated):
+        rows = list(model.objects.filter(**{field: value}).order_by('pk'))
+        yield rows[0], rows[1:]
+
+
+def deduplicate_external_ids(apps, schema_editor):
+    PaymentMethod = apps.get_model('payments', 'PaymentMethod')
+    Payment = apps.get_model('payments', 'Payment')
+
+    for keep, duplicates in get_duplicates(PaymentMethod, 'external_payment_method_id'):
+        duplicate_pks = [row.pk for row in duplicates]
+        Payment.objects.filter(payment_method__in=duplicate_pks).update(payment_method=keep)
+        PaymentMethod.objects.filter(pk__in=duplicate_pks).delete()
+
+    for keep, duplicates in get_duplicates(Payment, 'external_payment_id'):
+        # Keep the subscription or payment method a duplicate may have been linked to.
+        for duplicate in duplicates:
+            keep.user_membership_id = keep.user_membership_id or duplicate.user_membership_id
+            keep.payment_method_id = keep.payment_method_id or duplicate.payment_method_id
+        keep.save(update_fields=['user_membership', 'payment_method'])
+        Payment.objects.filter(pk__in=[row.pk for row in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_alter_payment_subtotal_alter_payment_tax_and_more'),
+        ('products', '0006_deduplicate_external_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_external_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_deduplicate_external_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='external_payment_id',
+            field=models.CharField(blank=True, db_index=True, max_length=50, verbose_name='stripe ID'),
+        ),
+        migrations.AlterField(
+            model_name='paymentmethod',
+            name='external_payment_method_id',
+            field=models.CharField(blank=True, db_index=True, max_length=50, verbose_name='stripe ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_payment_id', ''), _negated=True), fields=('external_payment_id',), name='unique_external_payment_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentmethod',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_payment_method_id', ''), _negated=True), fields=('external_payment_method_id',), name='unique_external_payment_method_id'),
+        ),
+    ]
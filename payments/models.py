@@ -32,7 +32,7 @@ class PaymentMethod(models.Model):
     ]
 
     external_payment_method_id = models.CharField(
-        _("stripe ID"), max_length=50, blank=True
+        _("stripe ID"), max_length=50, blank=True, db_index=True
     )
     user = models.ForeignKey(
         "users.CustomerUser", verbose_name=_("cliente"), on_delete=models.CASCADE
@@ -66,6 +66,13 @@ class PaymentMethod(models.Model):
     class Meta:
         verbose_name = _("payment method")
         verbose_name_plural = _("payment methods")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["external_payment_method_id"],
+                condition=~models.Q(external_payment_method_id=""),
+                name="unique_external_payment_method_id",
+            ),
+        ]
 
 
 class Payment(models.Model):
@@ -73,7 +80,9 @@ class Payment(models.Model):
     Represents a payment made by a user for a membership.
     """
 
-    external_payment_id = models.CharField(_("stripe ID"), max_length=50, blank=True)
+    external_payment_id = models.CharField(
+        _("stripe ID"), max_length=50, blank=True, db_index=True
+    )
     description = models.CharField(
         _("description"), max_length=150, blank=True, null=True
     )
@@ -130,3 +139,14 @@ class Payment(models.Model):
     class Meta:
         verbose_name = _("payment")
         verbose_name_plural = _("payments")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["external_payment_id"],
+                condition=~models.Q(external_payment_id=""),
+                name="unique_external_payment_id",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "-date"], name="payment_status_date_idx"),
+            models.Index(fields=["-date"], name="payment_date_idx"),
+        ]
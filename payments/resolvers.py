@@ -0,0 +1,4 @@
+from innovatix.core.resolvers import CachedResolver
+from payments.models import PaymentMethod
+
+payment_method_resolver = CachedResolver(PaymentMethod, "external_payment_method_id")
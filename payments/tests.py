@@ -1,12 +1,17 @@
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
-from django.test import Client
+import stripe
+from django.test import AsyncRequestFactory, Client, override_settings
 from django.urls import reverse
 from innovatix.core.tests import BaseTestCase
 from innovatix.geo_territories.utils import get_default_country, get_default_province
 from innovatix.users.utils import create_fake_customer_user
+from payments.checks import check_async_checkout_client
 from payments.constants import SUCCEEDED
 from payments.utils import create_fake_payment, create_fake_payment_method
+from payments.views import AsyncPaymentInfoFormView
+from products.models import Membership
+from products.pricing import get_pricing
 from products.utils import create_fake_membership, create_fake_subscription
 
 
@@ -98,6 +103,20 @@ class PaymentInfoPageViewTest(BaseTestCase):
             response, reverse("payments:payment-success"), response.status_code, 200
         )
 
+    @patch(
+        "products.services.payment_gateway.create_confirm_subscription",
+        return_value={"code": SUCCEEDED},
+    )
+    def test_charges_the_current_price(self, mock_create_confirm_subscription):
+        get_pricing(self.membership.slug)
+        # Not through save(), so the cached pricing is stale.
+        Membership.objects.filter(pk=self.membership.pk).update(recurring_price=2000)
+
+        self._test_response(mock_create_confirm_subscription, 302)
+
+        membership = mock_create_confirm_subscription.call_args.kwargs["membership"]
+        self.assertEqual(membership.recurring_price, 2000)
+
     @patch(
         "products.services.payment_gateway.create_confirm_subscription",
         return_value={"code": "error", "error": {"message": "Test error message"}},
@@ -132,3 +151,66 @@ class PaymentInfoPageViewTest(BaseTestCase):
         self.assertEqual(response.status_code, 302)
 
         mock_create_confirm_subscription.assert_not_called()
+
+
+class AsyncPaymentInfoFormViewTest(BaseTestCase):
+    def setUp(self):
+        self.membership = create_fake_membership()
+        self.user = create_fake_customer_user(
+            get_default_province(), get_default_country()
+        )
+        self.user.external_customer_id = "some_id"
+        self.user.save()
+        self.url = reverse(
+            "payments:payment-info", kwargs={"slug": self.membership.slug}
+        )
+
+    async def _post(self):
+        request = AsyncRequestFactory().post(
+            self.url,
+            {"card_name": "Test Example", "payment_method_id": "pm_test1"},
+        )
+
+        with patch("payments.views.get_user", return_value=self.user):
+            return await AsyncPaymentInfoFormView.as_view()(
+                request, slug=self.membership.slug
+            )
+
+    @patch(
+        "products.services.async_payment_gateway.acreate_confirm_subscription",
+        new_callable=AsyncMock,
+        return_value={"code": SUCCEEDED},
+    )
+    async def test_valid_response(self, mock_acreate_confirm_subscription):
+        response = await self._post()
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, reverse("payments:payment-success"))
+        self.assertEqual(
+            mock_acreate_confirm_subscription.call_args.kwargs["customer_id"],
+            "some_id",
+        )
+
+    @patch(
+        "products.services.async_payment_gateway.acreate_confirm_subscription",
+        new_callable=AsyncMock,
+        side_effect=Exception("Stripe is down"),
+    )
+    async def test_error_response(self, mock_acreate_confirm_subscription):
+        response = await self._post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("payment", response.context_data["form"].non_field_errors()[0])
+
+    def test_async_checkout_requires_an_async_client(self):
+        with override_settings(ASYNC_CHECKOUT=False):
+            self.assertEqual(check_async_checkout_client(None), [])
+
+        with override_settings(ASYNC_CHECKOUT=True), patch(
+            "stripe.http_client.new_http_client_async_fallback",
+            return_value=stripe.http_client.NoImportFoundAsyncClient(),
+        ):
+            self.assertEqual(
+                [error.id for error in check_async_checkout_client(None)],
+                ["payments.E001"],
+            )
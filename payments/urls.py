@@ -1,13 +1,23 @@
+from django.conf import settings
 from django.urls import path
 
-from payments.views import PaymentCanceledView, PaymentInfoFormView, PaymentSuccessView
+from payments.views import (
+    AsyncPaymentInfoFormView,
+    PaymentCanceledView,
+    PaymentInfoFormView,
+    PaymentSuccessView,
+)
 
 app_name = "payments"
 
 urlpatterns = [
     path(
         "membresias/<slug:slug>/pago-info/",
-        PaymentInfoFormView.as_view(),
+        (
+            AsyncPaymentInfoFormView
+            if getattr(settings, "ASYNC_CHECKOUT", False)
+            else PaymentInfoFormView
+        ).as_view(),
         name="payment-info",
     ),
     path(
@@ -1,7 +1,9 @@
 import logging
 from typing import Any
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.contrib.auth import get_user
 from django.http import (
     HttpRequest,
     HttpResponse,
@@ -16,8 +18,9 @@ from django.views.generic import FormView
 from innovatix.core.views import CoreTemplateView
 from payments.constants import SUCCEEDED
 from payments.forms import PaymentMethodForm
-from products.services import payment_gateway
-from products.views import MembershipInfoMixin
+from products.models import Membership
+from products.services import async_payment_gateway, payment_gateway
+from products.views import AsyncMembershipInfoMixin, MembershipInfoMixin
 
 logger = logging.getLogger("django")
 
@@ -75,37 +78,57 @@ class PaymentInfoFormView(MembershipInfoMixin, FormView):
         payment_method_id: str = form.cleaned_data["payment_method_id"]
 
         try:
+            # Charged from a fresh read: the cached pricing may predate a price change.
+            membership = Membership.objects.get(
+                pk=self.membership.pk, is_purchasable=True
+            )
             payment_response = payment_gateway.create_confirm_subscription(
-                customer_id=self.request.user.external_customer_id,
-                payment_method_id=payment_method_id,
-                membership=self.membership,
-                ip_address=get_client_ip(self.request),
-                user_agent=self.request.META.get("HTTP_USER_AGENT"),
+                **self.get_subscription_kwargs(form, membership)
             )
-        except payment_gateway.stripe.CardError as err:
+        except Exception as err:
+            payment_response = self.get_error_response(err)
+
+        return self.handle_payment_response(form, payment_response)
+
+    def get_subscription_kwargs(
+        self, form: PaymentMethodForm, membership: Membership
+    ) -> dict[str, Any]:
+        return {
+            "customer_id": self.request.user.external_customer_id,
+            "payment_method_id": form.cleaned_data["payment_method_id"],
+            "membership": membership,
+            "ip_address": get_client_ip(self.request),
+            "user_agent": self.request.META.get("HTTP_USER_AGENT"),
+        }
+
+    def get_error_response(self, err: Exception) -> dict[str, Any]:
+        if isinstance(err, payment_gateway.stripe.CardError):
             logger.error(
                 f"Card error: {getattr(err, 'user_message', 'An error occurred')}"
             )
-            payment_response = {
+            return {
                 "status": getattr(err, "http_status", 400),
                 "client_secret": None,
                 "message": getattr(err, "user_message", "An error occurred"),
                 "code": getattr(err, "code", "card_error"),
                 "error": {"message": getattr(err, "user_message", "An error occurred")},
             }
-        except Exception as err:
-            payment_response = {
-                "status": getattr(err, "http_status", 500),
-                "client_secret": None,
-                "message": str(err),
-                "code": getattr(err, "code", "internal_error"),
-                "error": {
-                    "message": _(
-                        "There was an error processing your payment. Try again later."
-                    )
-                },
-            }
 
+        return {
+            "status": getattr(err, "http_status", 500),
+            "client_secret": None,
+            "message": str(err),
+            "code": getattr(err, "code", "internal_error"),
+            "error": {
+                "message": _(
+                    "There was an error processing your payment. Try again later."
+                )
+            },
+        }
+
+    def handle_payment_response(
+        self, form: PaymentMethodForm, payment_response: dict[str, Any]
+    ) -> HttpResponseRedirect | HttpResponsePermanentRedirect | HttpResponse:
         if payment_response["code"] == SUCCEEDED:
             return super().form_valid(form)
         elif payment_response["code"] == "requires_action":
@@ -116,3 +139,65 @@ class PaymentInfoFormView(MembershipInfoMixin, FormView):
 
         form.add_error(None, payment_response["error"]["message"])
         return self.form_invalid(form)
+
+
+class AsyncPaymentInfoFormView(AsyncMembershipInfoMixin, PaymentInfoFormView):
+    """
+    Async version of ``PaymentInfoFormView``.
+
+    Served under ASGI, the Stripe calls of a checkout are awaited on the event
+    loop, so one worker can hold many checkouts in flight. Enable it with the
+    ``ASYNC_CHECKOUT`` setting.
+    """
+
+    async def dispatch(
+        self, request: HttpRequest, *args: Any, **kwargs: dict[str, Any]
+    ) -> HttpResponseRedirect | HttpResponsePermanentRedirect | HttpResponse:
+        await self.aload_membership()
+        # ``request.user`` is lazy and would query the database from the event
+        # loop, so load it in a thread once for the rest of the request.
+        request.user = user = await sync_to_async(get_user)(request)
+
+        if not user.is_authenticated:
+            login_url = reverse("account_login")
+            next_url = reverse(
+                "products:customer-info", args=[str(self.membership.slug)]
+            )
+            return redirect(f"{login_url}?next={next_url}")
+
+        if not user.external_customer_id:
+            return redirect("products:customer-info", slug=str(self.membership.slug))
+
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            handler = self.http_method_not_allowed
+
+        return await handler(request, *args, **kwargs)
+
+    async def get(
+        self, request: HttpRequest, *args: Any, **kwargs: dict[str, Any]
+    ) -> HttpResponse:
+        return super().get(request, *args, **kwargs)
+
+    async def post(
+        self, request: HttpRequest, *args: Any, **kwargs: dict[str, Any]
+    ) -> HttpResponseRedirect | HttpResponsePermanentRedirect | HttpResponse:
+        form = self.get_form()
+
+        if not form.is_valid():
+            return self.form_invalid(form)
+
+        try:
+            membership = await Membership.objects.aget(
+                pk=self.membership.pk, is_purchasable=True
+            )
+            payment_response = await async_payment_gateway.acreate_confirm_subscription(
+                **self.get_subscription_kwargs(form, membership)
+            )
+        except Exception as err:
+            payment_response = self.get_error_response(err)
+
+        return self.handle_payment_response(form, payment_response)
+
+    async def put(self, *args: Any, **kwargs: Any) -> HttpResponse:
+        return await self.post(*args, **kwargs)
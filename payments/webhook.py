@@ -1,9 +1,14 @@
 import logging
+from typing import Any
 
 import stripe
 from innovatix.users.models import CustomerUser
+from innovatix.users.resolvers import customer_resolver
 from payments.models import Payment, PaymentMethod
+from payments.resolvers import payment_method_resolver
 from products.models import UserMembership
+from products.resolvers import subscription_resolver
+from products.services import payment_gateway
 
 logger = logging.getLogger("django")
 
@@ -11,9 +16,7 @@ logger = logging.getLogger("django")
 def handle_payment_update(event: stripe.Event):
     try:
         invoice: stripe.Invoice = event.data.object
-        subscription = UserMembership.objects.get(
-            external_subscription_id=invoice.subscription
-        )
+        subscription = subscription_resolver.get(invoice.subscription)
         Payment.objects.update_or_create(
             external_payment_id=invoice.payment_intent,
             defaults={
@@ -24,6 +27,7 @@ def handle_payment_update(event: stripe.Event):
                 "status": invoice.status,
             },
         )
+        UserMembership.objects.filter(pk=subscription.pk).refresh_billing()
     except Exception as err:
         logger.error(f"Creating Payment from webhook: {err}")
         raise
@@ -37,9 +41,7 @@ def handle_payment_creation(event: stripe.Event):
             defaults={
                 "status": data.status,
                 "description": data.description,
-                "payment_method": PaymentMethod.objects.get(
-                    external_payment_method_id=data.payment_method
-                ),
+                "payment_method": payment_method_resolver.get(data.payment_method),
             },
         )
     except Exception as err:
@@ -47,28 +49,37 @@ def handle_payment_creation(event: stripe.Event):
         raise
 
 
+def get_payment_method_data(
+    stripe_payment_method: stripe.PaymentMethod, customer: CustomerUser
+) -> dict[str, Any]:
+    billing_details = stripe_payment_method.get("billing_details", {})
+    card_details = stripe_payment_method.get("card", {})
+
+    return {
+        "external_payment_method_id": stripe_payment_method["id"],
+        "user": customer,
+        "card_name": billing_details.get("name", ""),
+        "type": card_details.get("brand", ""),
+        "last_four": card_details.get("last4", ""),
+        "expiration_month": card_details.get("exp_month", ""),
+        "expiration_year": card_details.get("exp_year", ""),
+    }
+
+
 def payment_method_update_or_create(stripe_payment_intent: stripe.PaymentIntent):
-    customer = CustomerUser.objects.get(
-        external_customer_id=stripe_payment_intent.customer
-    )
+    customer = customer_resolver.get(stripe_payment_intent.customer)
 
-    payment_method_id = stripe_payment_intent["payment_method"]
-    stripe_payment_method = stripe.PaymentMethod.retrieve(payment_method_id)
+    stripe_payment_method = stripe_payment_intent["payment_method"]
 
-    billing_details = stripe_payment_method.get("billing_details", {})
-    card_details = stripe_payment_method.get("card", {})
+    # Intents fetched with ``expand=["payment_method"]`` already carry it.
+    if isinstance(stripe_payment_method, str):
+        stripe_payment_method = payment_gateway.execute(
+            stripe.PaymentMethod.retrieve, stripe_payment_method
+        )
 
     PaymentMethod.objects.update_or_create(
         external_payment_method_id=stripe_payment_method["id"],
-        defaults={
-            "external_payment_method_id": stripe_payment_method["id"],
-            "user": customer,
-            "card_name": billing_details.get("name", ""),
-            "type": card_details.get("brand", ""),
-            "last_four": card_details.get("last4", ""),
-            "expiration_month": card_details.get("exp_month", ""),
-            "expiration_year": card_details.get("exp_year", ""),
-        },
+        defaults=get_payment_method_data(stripe_payment_method, customer),
     )
 
 
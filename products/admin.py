@@ -1,4 +1,3 @@
-import statistics
 from typing import Any
 
 from django.conf import settings
@@ -6,11 +5,10 @@ from django.contrib import admin, messages
 from django.contrib.admin.options import IS_POPUP_VAR
 from django.contrib.admin.utils import unquote
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count
 from django.db.models.query import QuerySet
 from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.http.request import HttpRequest
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.template.response import TemplateResponse
 from django.urls import path, reverse
 from django.urls.resolvers import URLPattern
@@ -19,10 +17,11 @@ from django.utils.html import escape, format_html
 from django.utils.safestring import SafeText
 from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
-from django.utils.translation import ngettext
 from django.views.decorators.debug import sensitive_post_parameters
 from django_summernote.admin import SummernoteModelAdmin
 from innovatix.core.admin import CoreAdmin
+from innovatix.core.paginator import EstimatedCountPaginator
+from innovatix.core.templatetags.core_tags import dollar_format
 from payments.admin import PaymentInline
 from products.constants import ENTRY_COST_HELP_TEXT, RECURRING_PRICE_HELP_TEXT
 from products.forms import (
@@ -31,11 +30,15 @@ from products.forms import (
     MembershipPriceChangeForm,
     UpdateSubscriptionPriceForm,
 )
-from products.models import Membership, UserMembership
+from products.models import Membership, RepricingItem, RepricingJob, UserMembership
+from products.repricing import SubscriptionRepricer, can_resume, create_repricing_job
 from products.services import payment_gateway
 
 sensitive_post_parameters_m = method_decorator(sensitive_post_parameters())
 
+UPDATE_PRICE_PREVIEW_SIZE = 20
+UPDATE_PRICE_DISTRIBUTION_SIZE = 10
+
 
 class SubscriptionAdminInline(admin.StackedInline):
     show_change_link = True
@@ -50,6 +53,9 @@ class SubscriptionAdminInline(admin.StackedInline):
     )
     readonly_fields = ("get_next_billing_date",)
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet[UserMembership]:
+        return super().get_queryset(request).select_related("user", "membership")
+
     def has_delete_permission(self, request, obj=None):
         return False
 
@@ -63,6 +69,9 @@ class SubscriptionAdminInline(admin.StackedInline):
 @admin.register(UserMembership)
 class UserMembershipAdmin(admin.ModelAdmin):
     list_filter = ("status",)
+    list_select_related = ("user", "membership")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fields = (
         "external_subscription_id",
         "user",
@@ -78,6 +87,7 @@ class UserMembershipAdmin(admin.ModelAdmin):
         "membership_name",
         "display_recurring_price",
         "date_subscribed",
+        "get_next_billing_date",
     )
     inlines = (PaymentInline,)
     actions = ["update_price"]
@@ -86,6 +96,10 @@ class UserMembershipAdmin(admin.ModelAdmin):
     def display_recurring_price(self, obj):
         return obj.get_display_recurring_price()
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet[UserMembership]:
+        # The change page and its breadcrumbs render ``__str__`` too.
+        return super().get_queryset(request).select_related("user", "membership")
+
     @admin.display(description="Membership", ordering="membership")
     def membership_name(self, obj):
         return obj.membership.name
@@ -103,47 +117,66 @@ class UserMembershipAdmin(admin.ModelAdmin):
     ) -> bool:
         return False
 
+    def get_urls(self) -> list[URLPattern]:
+        return [
+            path(
+                "repricing/<int:job_id>/",
+                self.admin_site.admin_view(self.repricing_progress),
+                name="products_usermembership_repricing",
+            ),
+        ] + super().get_urls()
+
+    def repricing_progress(self, request: HttpRequest, job_id: int) -> HttpResponse:
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        job = get_object_or_404(RepricingJob, pk=job_id)
+
+        if request.method == "POST" and SubscriptionRepricer().start(job):
+            messages.info(request, _("The repricing job was resumed."))
+            return HttpResponseRedirect(request.get_full_path())
+
+        return TemplateResponse(
+            request,
+            "admin/products/subscription/repricing_progress.html",
+            {
+                **self.admin_site.each_context(request),
+                "opts": self.opts,
+                "title": _("Update price: %s") % job,
+                "job": job,
+                "progress": job.get_progress(),
+                "can_resume": can_resume(job),
+                "failed_items": job.items.filter(
+                    status=RepricingItem.FAILED
+                ).select_related("subscription__user", "subscription__membership")[:50],
+                "is_finished": job.status in [RepricingJob.DONE, RepricingJob.FAILED],
+            },
+        )
+
     @admin.display(description="Update price for selected subscriptions")
     def update_price(
         self, request: HttpRequest, queryset: QuerySet[UserMembership]
     ) -> HttpResponseRedirect | HttpResponse:
         # Sets the initial value of "new_price" to the mode (most frequently occurring value)
-        # of the recurring prices from the selected queryset of instances.
-        initial = {
-            "new_price": statistics.mode(
-                [instance.get_recurring_price() for instance in queryset]
-            )
-        }
+        # of the recurring prices, grouped and counted by the database.
+        distribution = queryset.price_distribution()
+        initial = {"new_price": distribution[0]["recurring_price"] / 100}
         form = UpdateSubscriptionPriceForm(initial=initial)
 
         if "apply" in request.POST:
             form = UpdateSubscriptionPriceForm(request.POST)
 
             if form.is_valid():
-                new_price = int(form.cleaned_data.get("new_price") * 100)
-                new_interval = form.cleaned_data.get("new_interval")
-
-                count = 0
-                for subscription in queryset:
-                    subscription.recurring_price = new_price
-                    subscription.recurring_payment = new_interval
-                    result = payment_gateway.update_subscription(subscription)
-
-                    if result:
-                        subscription.save()
-                        count += 1
-
-                self.message_user(
-                    request,
-                    ngettext(
-                        "%d subscription was successfully updated.",
-                        "%d subscriptions were successfully updated.",
-                        count,
-                    )
-                    % count,
-                    messages.SUCCESS if count >= 1 else messages.ERROR,
+                job = create_repricing_job(
+                    queryset,
+                    new_price=int(form.cleaned_data.get("new_price") * 100),
+                    new_interval=form.cleaned_data.get("new_interval"),
+                )
+                SubscriptionRepricer().start(job)
+
+                return HttpResponseRedirect(
+                    reverse("admin:products_usermembership_repricing", args=[job.pk])
                 )
-                return HttpResponseRedirect(request.get_full_path())
 
         item = {
             "verbose_name": queryset.model._meta.verbose_name,
@@ -152,11 +185,29 @@ class UserMembershipAdmin(admin.ModelAdmin):
 
         action = _("update_price")
 
+        count = sum(row["count"] for row in distribution)
+
         return render(
             request,
             "admin/products/subscription/update_price.html",
             context={
-                "queryset": queryset,
+                "count": count,
+                "preview": queryset.select_related("user", "membership")[
+                    :UPDATE_PRICE_PREVIEW_SIZE
+                ],
+                "price_distribution": [
+                    {
+                        "price": dollar_format(row["recurring_price"] / 100),
+                        "count": row["count"],
+                        "percent": round(row["count"] * 100 / count),
+                    }
+                    for row in distribution[:UPDATE_PRICE_DISTRIBUTION_SIZE]
+                ],
+                # Posted back as they came, so "select all" does not list every row.
+                "selected_actions": request.POST.getlist(
+                    admin.helpers.ACTION_CHECKBOX_NAME
+                ),
+                "select_across": request.POST.get("select_across", "0"),
                 "form": form,
                 "item": item,
                 "action": action,
@@ -244,11 +295,11 @@ class MembershipAdmin(CoreAdmin, SummernoteModelAdmin):
 
     def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
         queryset = super().get_queryset(request)
-        return queryset.annotate(_subscription_count=Count("usermembership"))
+        return queryset.with_subscription_counts()
 
-    @admin.display(description="Subscriptions", ordering="_subscription_count")
+    @admin.display(description="Subscriptions", ordering="active_subscription_count")
     def subscription_count_link(self, obj) -> SafeText:
-        count = obj._subscription_count
+        count = obj.active_subscription_count
         url = (
             reverse("admin:products_usermembership_changelist")
             + f"?status__exact=active&membership__id={obj.pk}"
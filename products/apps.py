@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "products"
+
+    def ready(self):
+        from innovatix.core.webhooks import register_webhook_handler
+        from products import signals  # noqa: F401
+        from products import webhook
+
+        register_webhook_handler(
+            "customer.subscription.created", webhook.handle_creation
+        )
+        register_webhook_handler("customer.subscription.updated", webhook.handle_update)
+        register_webhook_handler("customer.subscription.deleted", webhook.handle_update)
+        register_webhook_handler("product.deleted", webhook.handle_product_deleted)
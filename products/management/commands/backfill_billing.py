@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from products.models import UserMembership
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored payment count and next billing date of every subscription"
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of subscriptions read and updated at once.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = UserMembership.objects.count()
+        last_pk, updated = 0, 0
+
+        # Page by primary key so every batch is a cheap index range scan.
+        while True:
+            pks = list(
+                UserMembership.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+
+            if not pks:
+                break
+
+            updated += UserMembership.objects.filter(pk__in=pks).refresh_billing(
+                batch_size=batch_size
+            )
+            last_pk = pks[-1]
+            self.stdout.write(f"  {updated}/{total} subscriptions updated")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} subscriptions"))
@@ -0,0 +1,215 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from typing import Any, Callable
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from innovatix.geo_territories.utils import get_default_country, get_default_province
+from innovatix.users.models import CustomerUser
+from payments.constants import PAYMENT_STATUS_CHOICES
+from payments.models import Payment
+from products.models import Membership, UserMembership
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the status and date filters of the subscription and payment "
+        "admins on large tables. The rows are created in a transaction that "
+        "is rolled back."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--payments",
+            type=int,
+            default=1_000_000,
+            help="Number of payments.",
+        )
+        parser.add_argument(
+            "--subscriptions",
+            type=int,
+            default=50_000,
+            help="Number of customers and subscriptions.",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=20,
+            help="Number of times each query is timed.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+        )
+
+    def handle(self, *args: Any, **options: Any):
+        with transaction.atomic():
+            memberships, customers = self.create_rows(
+                options["subscriptions"], options["payments"], options["batch_size"]
+            )
+
+            if connection.vendor in ("postgresql", "sqlite"):
+                # Fresh statistics, so the planner knows the indexes are selective.
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+
+            membership, customer = memberships[0], random.choice(customers)
+
+            for label, function in [
+                (
+                    "Membership.is_linked_to_subscriptions",
+                    membership.is_linked_to_subscriptions,
+                ),
+                (
+                    "Active subscriptions of a customer",
+                    UserMembership.objects.filter(
+                        user=customer, status="active"
+                    ).exists,
+                ),
+            ]:
+                self.benchmark(label, function, options["runs"])
+
+            for label, model_admin, params in [
+                ("Subscription admin", admin.site._registry[UserMembership], {}),
+                (
+                    "Subscription admin, status=past_due",
+                    admin.site._registry[UserMembership],
+                    {"status__exact": "past_due"},
+                ),
+                ("Payment admin", admin.site._registry[Payment], {}),
+                (
+                    "Payment admin, status=failed",
+                    admin.site._registry[Payment],
+                    {"status__exact": "failed"},
+                ),
+                (
+                    "Payment admin, status=failed, past 7 days",
+                    admin.site._registry[Payment],
+                    {
+                        "status__exact": "failed",
+                        "date__gte": (timezone.now() - timedelta(days=7)).isoformat(),
+                    },
+                ),
+            ]:
+                self.benchmark(
+                    label,
+                    lambda: self.get_changelist_page(model_admin, params),
+                    options["runs"],
+                )
+
+            self.stdout.write(
+                "  "
+                + Payment.objects.filter(status="failed")
+                .order_by("-date")[:100]
+                .explain()
+            )
+
+            transaction.set_rollback(True)
+
+    def create_rows(
+        self, subscriptions: int, payments: int, batch_size: int
+    ) -> tuple[list[Membership], list[CustomerUser]]:
+        self.stdout.write(
+            f"Creating {subscriptions} subscriptions and {payments} payments..."
+        )
+        country, province = get_default_country(), get_default_province()
+        memberships = [
+            Membership.objects.create(
+                external_product_id=f"prod_benchmark{number}",
+                name=f"Benchmark {number}",
+                slug=f"benchmark-{number}",
+                entry_cost=0,
+                recurring_price=1000,
+                recurring_payment="month",
+            )
+            for number in range(5)
+        ]
+        # Most subscriptions are active, like in production.
+        subscription_statuses = [
+            status for status, _ in UserMembership.MEMBERSHIP_STATUS_CHOICES
+        ]
+        subscription_weights = [20] + [1] * (len(subscription_statuses) - 1)
+        customers, subscription_ids = [], []
+
+        for start in range(0, subscriptions, batch_size):
+            numbers = range(start, min(start + batch_size, subscriptions))
+            batch = CustomerUser.objects.bulk_create(
+                CustomerUser(
+                    email=f"benchmark{number}@example.com",
+                    first_name="Benchmark",
+                    last_name=str(number),
+                    partner_number=f"benchmark-{number}",
+                    country=country,
+                    province=province,
+                )
+                for number in numbers
+            )
+            customers.extend(batch)
+            subscription_ids.extend(
+                subscription.pk
+                for subscription in UserMembership.objects.bulk_create(
+                    UserMembership(
+                        user=customer,
+                        membership=random.choice(memberships),
+                        status=random.choices(
+                            subscription_statuses, subscription_weights
+                        )[0],
+                        recurring_price=1000,
+                        recurring_payment="month",
+                    )
+                    for customer in batch
+                )
+            )
+
+        payment_statuses = [status for status, _ in PAYMENT_STATUS_CHOICES]
+        payment_weights = [50] + [1] * (len(payment_statuses) - 1)
+        now = timezone.now()
+
+        for start in range(0, payments, batch_size):
+            Payment.objects.bulk_create(
+                Payment(
+                    user_membership_id=random.choice(subscription_ids),
+                    date=now - timedelta(minutes=random.randrange(3 * 365 * 24 * 60)),
+                    total=1000,
+                    status=random.choices(payment_statuses, payment_weights)[0],
+                )
+                for _ in range(min(batch_size, payments - start))
+            )
+            self.stdout.write(f"  {min(start + batch_size, payments)} payments")
+
+        return memberships, customers
+
+    def get_changelist_page(
+        self, model_admin: admin.ModelAdmin, params: dict[str, str]
+    ) -> list[Any]:
+        """
+        Run the queries of a changelist page: its count and its rows.
+        """
+        request = RequestFactory().get("/", params)
+        request.user = CustomerUser(is_staff=True, is_superuser=True)
+        changelist = model_admin.get_changelist_instance(request)
+
+        return list(changelist.result_list)
+
+    def benchmark(self, label: str, function: Callable[[], Any], runs: int) -> None:
+        timings = []
+
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started_at)
+
+        timings.sort()
+        self.stdout.write(
+            f"{label}: "
+            f"avg {statistics.mean(timings) * 1000:.3f}ms, "
+            f"p95 {timings[int(len(timings) * 0.95)] * 1000:.3f}ms, "
+            f"max {timings[-1] * 1000:.3f}ms"
+        )
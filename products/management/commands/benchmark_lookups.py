@@ -0,0 +1,134 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from innovatix.geo_territories.utils import get_default_country, get_default_province
+from innovatix.users.models import CustomerUser
+from payments.models import Payment, PaymentMethod
+from products.models import Membership, UserMembership
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the Stripe ID lookups run by webhooks and syncs on a large "
+        "table. The rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=100_000,
+            help="Number of customers, subscriptions, payment methods and payments.",
+        )
+        parser.add_argument(
+            "--lookups",
+            type=int,
+            default=1_000,
+            help="Number of lookups timed per column.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5_000,
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.create_rows(options["rows"], options["batch_size"])
+
+            for model, field, prefix in [
+                (CustomerUser, "external_customer_id", "cus"),
+                (UserMembership, "external_subscription_id", "sub"),
+                (PaymentMethod, "external_payment_method_id", "pm"),
+                (Payment, "external_payment_id", "pi"),
+            ]:
+                self.benchmark(
+                    model, field, prefix, options["rows"], options["lookups"]
+                )
+
+            transaction.set_rollback(True)
+
+    def create_rows(self, rows: int, batch_size: int) -> None:
+        self.stdout.write(f"Creating {rows} rows per table...")
+        country, province = get_default_country(), get_default_province()
+        membership = Membership.objects.create(
+            external_product_id="prod_benchmark",
+            name="Benchmark",
+            slug="benchmark",
+            entry_cost=0,
+            recurring_price=1000,
+            recurring_payment="month",
+        )
+
+        for start in range(0, rows, batch_size):
+            numbers = range(start, min(start + batch_size, rows))
+            customers = CustomerUser.objects.bulk_create(
+                CustomerUser(
+                    email=f"benchmark{number}@example.com",
+                    first_name="Benchmark",
+                    last_name=str(number),
+                    partner_number=f"benchmark-{number}",
+                    external_customer_id=f"cus_benchmark{number}",
+                    country=country,
+                    province=province,
+                )
+                for number in numbers
+            )
+            subscriptions = UserMembership.objects.bulk_create(
+                UserMembership(
+                    external_subscription_id=f"sub_benchmark{number}",
+                    user=customer,
+                    membership=membership,
+                    recurring_price=1000,
+                    recurring_payment="month",
+                )
+                for number, customer in zip(numbers, customers)
+            )
+            payment_methods = PaymentMethod.objects.bulk_create(
+                PaymentMethod(
+                    external_payment_method_id=f"pm_benchmark{number}",
+                    user=customer,
+                    card_name="Benchmark",
+                    type="visa",
+                    last_four="4242",
+                    expiration_month=12,
+                    expiration_year=2030,
+                )
+                for number, customer in zip(numbers, customers)
+            )
+            Payment.objects.bulk_create(
+                Payment(
+                    external_payment_id=f"pi_benchmark{number}",
+                    user_membership=subscription,
+                    payment_method=payment_method,
+                    total=1000,
+                    status="succeeded",
+                )
+                for number, subscription, payment_method in zip(
+                    numbers, subscriptions, payment_methods
+                )
+            )
+
+    def benchmark(
+        self, model, field: str, prefix: str, rows: int, lookups: int
+    ) -> None:
+        values = [f"{prefix}_benchmark{random.randrange(rows)}" for _ in range(lookups)]
+        timings = []
+
+        for value in values:
+            started_at = time.perf_counter()
+            model.objects.get(**{field: value})
+            timings.append(time.perf_counter() - started_at)
+
+        timings.sort()
+        self.stdout.write(
+            f"{model.__name__}.{field}: "
+            f"avg {statistics.mean(timings) * 1000:.3f}ms, "
+            f"p95 {timings[int(len(timings) * 0.95)] * 1000:.3f}ms, "
+            f"max {timings[-1] * 1000:.3f}ms"
+        )
+        self.stdout.write(f"  {model.objects.filter(**{field: values[0]}).explain()}")
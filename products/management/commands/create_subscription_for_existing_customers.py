@@ -18,7 +18,7 @@ class Command(BaseCommand):
         created_subscription_emails = []
         created_subscription_emails_to_start_tomorrow = []
 
-        customers = payment_gateway.fetch_all("Customer", limit=100)
+        customers = payment_gateway.iter_all("Customer", limit=100)
 
         for customer in customers:
             if customer["email"] in seen_emails:
@@ -77,6 +77,8 @@ class Command(BaseCommand):
             f"Subscription created emails for tomorrow: ({len(created_subscription_emails_to_start_tomorrow)})"
         )
         print(created_subscription_emails_to_start_tomorrow)
+        print()
+        print(f"Stripe requests: {payment_gateway.stats()}")
 
     def create_subscription(self, membership, customer, payments, **kwargs):
         stripe_timestamp = payments[0]["created"]
@@ -87,7 +89,9 @@ class Command(BaseCommand):
 
         next_billing_date = stripe_datetime + relativedelta(**kwargs)
 
-        return payment_gateway.stripe.Subscription.create(
+        return payment_gateway.execute(
+            payment_gateway.stripe.Subscription.create,
+            mutating=True,
             customer=customer["id"],
             items=[
                 {
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from products.models import RepricingJob
+from products.repricing import SubscriptionRepricer, claim_job
+
+
+class Command(BaseCommand):
+    help = "Run or resume the subscription repricing jobs that did not finish"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--job",
+            type=int,
+            help="Only run the job with this ID.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=5,
+            help="Number of Stripe subscriptions updated at the same time.",
+        )
+
+    def handle(self, *args, **options):
+        jobs = RepricingJob.objects.order_by("pk")
+
+        if options["job"] is not None:
+            jobs = jobs.filter(pk=options["job"])
+
+        repricer = SubscriptionRepricer(workers=options["workers"])
+
+        for job in jobs.exclude(status=RepricingJob.DONE):
+            if not claim_job(job):
+                continue
+
+            repricer.run(job)
+            progress = job.get_progress()
+            self.stdout.write(
+                f"{job}: {progress['succeeded']} succeeded, {progress['failed']} failed"
+            )
@@ -1,110 +1,185 @@
-from datetime import datetime
-from typing import Any
+import time
+from collections import defaultdict
+from itertools import chain
+from typing import Any, Iterable
 
 import stripe
-from django.core.management.base import BaseCommand
-from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandParser
 
+from innovatix.core.models import SyncState
+from innovatix.core.services.fetcher import ConcurrentFetcher
 from innovatix.users.models import CustomerUser
-from innovatix.users.models.customer_user import CustomerUser
-from innovatix.users.webhook import get_sanitized_data
-from payments.models import Payment, PaymentMethod
-from payments.webhook import payment_method_update_or_create
-from products.models import UserMembership
+from payments.models import Payment
 from products.services import payment_gateway
-from products.webhook import handle_update_or_create
+from products.sync import DEFAULT_BATCH_SIZE, StripeBulkSync
+
+SYNC_RESOURCES = ["Customer", "Subscription", "PaymentIntent", "Invoice"]
+
+# Events replayed by incremental syncs to pick up changes to older objects.
+EVENT_TYPES = [
+    "customer.updated",
+    "customer.deleted",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+    "payment_intent.succeeded",
+    "payment_intent.payment_failed",
+    "payment_intent.canceled",
+    "invoice.updated",
+    "invoice.paid",
+    "invoice.payment_failed",
+]
+
+SYNC_OVERLAP_SECONDS = 300
 
 
 class Command(BaseCommand):
     help = "Sync local database with Stripe data"
 
-    def __init__(self):
-        super().__init__()
-
-        self.customer_ids: list[str] = []
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=5,
+            help="Maximum number of Stripe requests in flight at the same time.",
+        )
+        parser.add_argument(
+            "--requests-per-second",
+            type=float,
+            default=20,
+            help="Request budget shared by every Stripe crawl.",
+        )
+        parser.add_argument(
+            "--prefetch",
+            type=int,
+            default=10,
+            help="Pages each crawl may fetch ahead of the database (0 for no limit).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of rows written per bulk query and transaction.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only fetch what changed since the last successful sync, without wiping tables.",
+        )
 
-    def handle(self, *args: Any, **kwargs: dict[str, Any]):
-        self.sync_customers()
-        self.sync_payment_methods()
-        self.sync_subscriptions()
-        self.sync_payments()
-        self.sync_invoices()
+    def handle(self, *args: Any, **options: Any):
+        self.bulk_sync = StripeBulkSync(
+            batch_size=options.get("batch_size", DEFAULT_BATCH_SIZE)
+        )
+        incremental = options.get("incremental", False)
+        # Every stage restarts from a bit before this run began, so objects
+        # created while it was running are picked up by the next one.
+        started_at = int(time.time()) - SYNC_OVERLAP_SECONDS
+
+        with ConcurrentFetcher(
+            payment_gateway,
+            max_workers=options.get("workers", 5),
+            requests_per_second=options.get("requests_per_second", 20),
+            prefetch=options.get("prefetch", 10),
+        ) as fetcher:
+            if incremental:
+                self.sync_incremental(fetcher)
+            else:
+                self.sync_all(fetcher)
+
+        for resource in [*SYNC_RESOURCES, "Event"]:
+            SyncState.mark(resource, started_at)
+
+    def list_params(self, resource: str) -> dict[str, Any]:
+        params = {"limit": 100}
+        high_water_mark = SyncState.get_high_water_mark(resource)
+
+        if high_water_mark is not None:
+            params["created"] = {"gte": high_water_mark}
+
+        return params
+
+    def sync_all(self, fetcher: ConcurrentFetcher):
+        # Start every independent crawl right away, then apply the results
+        # in the order the foreign keys require.
+        stripe_customers = fetcher.submit("Customer", limit=100)
+        stripe_subscriptions = fetcher.submit("Subscription", limit=100)
+        stripe_payment_intents = fetcher.submit(
+            "PaymentIntent", expand=["data.payment_method"], limit=100
+        )
+        stripe_invoices = fetcher.submit("Invoice", limit=100)
 
-    def sync_customers(self):
         CustomerUser.objects.all().delete()
+        Payment.objects.all().delete()
+        self.sync_customers(stripe_customers)
+        self.sync_payment_intents(stripe_payment_intents)
+        self.sync_subscriptions(stripe_subscriptions)
+        self.sync_invoices(stripe_invoices)
+
+    def sync_incremental(self, fetcher: ConcurrentFetcher):
+        """
+        Fetch only what changed since the last successful run.
+
+        New objects come from ``created[gte]`` list calls; changes to older
+        objects are replayed from the events emitted since then. Nothing is
+        deleted up front.
+        """
+        stripe_customers = fetcher.submit("Customer", **self.list_params("Customer"))
+        stripe_subscriptions = fetcher.submit(
+            "Subscription", **self.list_params("Subscription")
+        )
+        stripe_payment_intents = fetcher.submit(
+            "PaymentIntent",
+            expand=["data.payment_method"],
+            **self.list_params("PaymentIntent"),
+        )
+        stripe_invoices = fetcher.submit("Invoice", **self.list_params("Invoice"))
+        changes = self.collect_changes(
+            fetcher.submit("Event", types=EVENT_TYPES, **self.list_params("Event"))
+        )
 
-        stripe_customers = payment_gateway.fetch_all("Customer", limit=100)
+        self.sync_customers(chain(stripe_customers, changes["customer"].values()))
+        self.bulk_sync.delete_customers(changes["customer.deleted"])
+        self.sync_payment_intents(
+            chain(stripe_payment_intents, changes["payment_intent"].values())
+        )
+        self.sync_subscriptions(
+            chain(stripe_subscriptions, changes["subscription"].values())
+        )
+        self.sync_invoices(chain(stripe_invoices, changes["invoice"].values()))
 
-        for stripe_customer in stripe_customers:
-            CustomerUser.objects.update_or_create(
-                email=stripe_customer.email,
-                defaults=get_sanitized_data(stripe_customer),
-            )
+    def collect_changes(
+        self, stripe_events: Iterable[stripe.Event]
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Keep the latest snapshot of every object changed by ``stripe_events``.
 
-            self.customer_ids.append(stripe_customer.id)
+        Stripe lists events newest first, so the first event seen for an
+        object carries its current state.
+        """
+        changes = defaultdict(dict)
 
-    def sync_subscriptions(self):
-        stripe_subscriptions: list[stripe.Subscription] = payment_gateway.fetch_all(
-            "Subscription", limit=100
-        )
-        for stripe_subscription in stripe_subscriptions:
-            # Convert timestamp to a datetime object
-            dt_object = datetime.fromtimestamp(stripe_subscription.created)
-            aware_dt_object = timezone.make_aware(dt_object)
-
-            handle_update_or_create(
-                stripe_subscription=stripe_subscription, date_subscribed=aware_dt_object
-            )
-
-    def sync_payment_methods(self):
-        for stripe_customer_id in self.customer_ids:
-            stripe_payment_intents: list[stripe.PaymentIntent] = (
-                payment_gateway.fetch_all(
-                    "PaymentIntent", customer=stripe_customer_id, limit=100
-                )
-            )
-            for stripe_payment_intent in stripe_payment_intents:
-                payment_method_update_or_create(stripe_payment_intent)
-
-    def sync_payments(self):
-        Payment.objects.all().delete()
+        for stripe_event in stripe_events:
+            obj = stripe_event.data.object
 
-        stripe_payments: list[stripe.PaymentIntent] = payment_gateway.fetch_all(
-            "PaymentIntent", limit=100
-        )
-        for stripe_payment in stripe_payments:
-            dt_object = datetime.fromtimestamp(stripe_payment.created)
-            aware_dt_object = timezone.make_aware(dt_object)
-            payment_method = PaymentMethod.objects.filter(
-                external_payment_method_id=stripe_payment.payment_method
-            ).first()
-            Payment.objects.update_or_create(
-                external_payment_id=stripe_payment.id,
-                defaults={
-                    "external_payment_id": stripe_payment.id,
-                    "description": stripe_payment.description,
-                    "user_membership": None,
-                    "payment_method": payment_method,
-                    "subtotal": stripe_payment.amount,
-                    "tax": 0,
-                    "total": stripe_payment.amount,
-                    "status": stripe_payment.status,
-                    "date": aware_dt_object,
-                },
-            )
-
-    def sync_invoices(self):
-        stripe_invoices = payment_gateway.fetch_all("Invoice", limit=100)
-
-        for stripe_invoice in stripe_invoices:
-            payment = Payment.objects.get(
-                external_payment_id=stripe_invoice.payment_intent
-            )
-
-            payment.user_membership = UserMembership.objects.filter(
-                external_subscription_id=stripe_invoice.subscription
-            ).first()
-            payment.subtotal = stripe_invoice.subtotal or 0
-            payment.tax = stripe_invoice.tax or 0
-            payment.total = stripe_invoice.total or 0
-            payment.save()
+            if stripe_event.type == "customer.deleted":
+                changes["customer.deleted"].setdefault(obj.id, obj.id)
+            else:
+                changes[obj.object].setdefault(obj.id, obj)
+
+        return changes
+
+    def sync_customers(self, stripe_customers: Iterable[stripe.Customer]):
+        self.bulk_sync.sync_customers(stripe_customers)
+
+    def sync_subscriptions(self, stripe_subscriptions: Iterable[stripe.Subscription]):
+        self.bulk_sync.sync_subscriptions(stripe_subscriptions)
+
+    def sync_payment_intents(
+        self, stripe_payment_intents: Iterable[stripe.PaymentIntent]
+    ):
+        # One account-wide crawl, with payment methods expanded, feeds both
+        # the payment methods and the payments.
+        self.bulk_sync.sync_payment_intents(stripe_payment_intents)
+
+    def sync_invoices(self, stripe_invoices: Iterable[stripe.Invoice]):
+        self.bulk_sync.sync_invoices(stripe_invoices)
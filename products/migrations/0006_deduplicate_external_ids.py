@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def get_duplicates(model, field):
+    """
+    Yield the oldest row and its duplicates for every Stripe ID used more
+    than once.
+    """
+    duplicated = (
+        model.objects.exclude(**{field: ''})
+        .values(field)
+        .annotate(count=Count('pk'))
+        .filter(count__gt=1)
+        .values_list(field, flat=True)
+    )
+
+    for value in list(duplicated):
+        rows = list(model.objects.filter(**{field: value}).order_by('pk'))
+        yield rows[0], rows[1:]
+
+
+def deduplicate_external_ids(apps, schema_editor):
+    Membership = apps.get_model('products', 'Membership')
+    UserMembership = apps.get_model('products', 'UserMembership')
+    Payment = apps.get_model('payments', 'Payment')
+
+    # Memberships are protected by their subscriptions; only unlink the extras.
+    for keep, duplicates in get_duplicates(Membership, 'external_product_id'):
+        Membership.objects.filter(pk__in=[row.pk for row in duplicates]).update(external_product_id='')
+
+    # Duplicated subscriptions come from racing webhooks; merge them into the oldest.
+    for keep, duplicates in get_duplicates(UserMembership, 'external_subscription_id'):
+        duplicate_pks = [row.pk for row in duplicates]
+        Payment.objects.filter(user_membership__in=duplicate_pks).update(user_membership=keep)
+        UserMembership.objects.filter(pk__in=duplicate_pks).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_alter_payment_subtotal_alter_payment_tax_and_more'),
+        ('products', '0005_alter_usermembership_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_external_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_deduplicate_external_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='membership',
+            name='external_product_id',
+            field=models.CharField(blank=True, db_index=True, max_length=50, verbose_name='stripe ID'),
+        ),
+        migrations.AlterField(
+            model_name='usermembership',
+            name='external_subscription_id',
+            field=models.CharField(blank=True, db_index=True, max_length=50, verbose_name='stripe ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='membership',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_product_id', ''), _negated=True), fields=('external_product_id',), name='unique_external_product_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='usermembership',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_subscription_id', ''), _negated=True), fields=('external_subscription_id',), name='unique_external_subscription_id'),
+        ),
+    ]
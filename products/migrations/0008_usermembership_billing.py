@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_external_id_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermembership',
+            name='next_billing_date',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='next billing date'),
+        ),
+        migrations.AddField(
+            model_name='usermembership',
+            name='successful_payment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='successful payments'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_usermembership_billing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepricingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('new_price', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)], verbose_name='price')),
+                ('new_interval', models.CharField(choices=[('day', 'Daily'), ('week', 'Weekly'), ('month', 'Monthly'), ('year', 'Annual')], max_length=30, verbose_name='recurring interval')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Finished with errors')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'repricing job',
+                'verbose_name_plural': 'repricing jobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='RepricingItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='products.repricingjob')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.usermembership')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'status'], name='repricing_item_status_idx')],
+            },
+        ),
+    ]
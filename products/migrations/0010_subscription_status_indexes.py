@@ -0,0 +1,34 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_repricingjob_repricingitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # The composite indexes are created before the foreign key indexes they
+    # replace are dropped.
+    operations = [
+        migrations.AddIndex(
+            model_name='usermembership',
+            index=models.Index(fields=['membership', 'status'], name='sub_membership_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermembership',
+            index=models.Index(fields=['user', 'status'], name='sub_user_status_idx'),
+        ),
+        migrations.AlterField(
+            model_name='usermembership',
+            name='membership',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='products.membership'),
+        ),
+        migrations.AlterField(
+            model_name='usermembership',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='customer'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
 from django.template.defaultfilters import date
 from django.urls import reverse
 from django.utils import timezone
@@ -15,12 +16,32 @@ from products.constants import (
 )
 
 
+class MembershipQuerySet(models.QuerySet):
+    def with_subscription_counts(self) -> "MembershipQuerySet":
+        """
+        Annotate the number of active and total subscriptions of each
+        membership, and whether it can be deleted, in one grouped query.
+        """
+        return self.annotate(
+            active_subscription_count=Count(
+                "usermembership", filter=Q(usermembership__status="active")
+            ),
+            subscription_count=Count("usermembership"),
+        ).annotate(
+            is_deletable=ExpressionWrapper(
+                Q(active_subscription_count=0), output_field=BooleanField()
+            )
+        )
+
+
 class Membership(models.Model):
     """
     Represents a membership that a customer can subscribe to.
     """
 
-    external_product_id = models.CharField(_("stripe ID"), max_length=50, blank=True)
+    external_product_id = models.CharField(
+        _("stripe ID"), max_length=50, blank=True, db_index=True
+    )
     name = models.CharField(_("name"), max_length=100)
     slug = models.SlugField(
         max_length=100,
@@ -48,9 +69,18 @@ class Membership(models.Model):
     created_at = models.DateTimeField(_("Created"), auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MembershipQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("membership")
         verbose_name_plural = _("memberships")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["external_product_id"],
+                condition=~models.Q(external_product_id=""),
+                name="unique_external_product_id",
+            ),
+        ]
 
     def delete(self, *args, **kwargs):
         if self.is_linked_to_subscriptions():
@@ -76,21 +106,69 @@ class Membership(models.Model):
         return reverse("products:membership-detail", args=[str(self.slug)])
 
     def get_subcriptions_count(self):
+        # Memberships from with_subscription_counts() already know it.
+        if hasattr(self, "subscription_count"):
+            return self.subscription_count
+
         return UserMembership.objects.filter(membership=self).count()
 
     def is_linked_to_subscriptions(self):
         """
         Check if this membership is associated with any subscriptions
         """
+        if hasattr(self, "is_deletable"):
+            return not self.is_deletable
+
         return UserMembership.objects.filter(membership=self, status="active").exists()
 
     def __str__(self) -> str:
         return f"{self.name} • {self.get_display_recurring_price()}"
 
 
+class UserMembershipQuerySet(models.QuerySet):
+    def price_distribution(self) -> list[dict[str, int]]:
+        """
+        Return the number of subscriptions per recurring price, most common
+        first, computed by the database.
+        """
+        return list(
+            self.order_by()
+            .values("recurring_price")
+            .annotate(count=Count("pk"))
+            .order_by("-count", "recurring_price")
+        )
+
+    def refresh_billing(self, batch_size: int = 500) -> int:
+        """
+        Recompute ``successful_payment_count`` and ``next_billing_date`` of
+        the subscriptions, with one query to read them and bulk updates.
+
+        :return: The number of subscriptions updated.
+        """
+        subscriptions = list(
+            self.select_related("membership").annotate(_payment_count=Count("payment"))
+        )
+
+        for subscription in subscriptions:
+            subscription.successful_payment_count = subscription._payment_count
+            subscription.next_billing_date = subscription.compute_next_billing_date()
+
+        self.model.objects.bulk_update(
+            subscriptions,
+            ["successful_payment_count", "next_billing_date"],
+            batch_size=batch_size,
+        )
+
+        return len(subscriptions)
+
+
 class UserMembership(models.Model):
     """
     Represents the association between a user and a membership.
+
+    ``successful_payment_count`` and ``next_billing_date`` are stored so lists
+    can show, filter and sort by them without a query per row. The payment
+    webhooks and syncs keep them up to date with ``refresh_billing``.
     """
 
     MEMBERSHIP_STATUS_CHOICES = [
@@ -105,14 +183,18 @@ class UserMembership(models.Model):
     ]
 
     external_subscription_id = models.CharField(
-        _("stripe ID"), max_length=50, blank=True
+        _("stripe ID"), max_length=50, blank=True, db_index=True
     )
+    # Both are indexed by the composite status indexes of Meta.
     user = models.ForeignKey(
         "users.CustomerUser",
         verbose_name=_("customer"),
         on_delete=models.CASCADE,
+        db_index=False,
+    )
+    membership = models.ForeignKey(
+        "Membership", on_delete=models.PROTECT, db_index=False
     )
-    membership = models.ForeignKey("Membership", on_delete=models.PROTECT)
     date_subscribed = models.DateTimeField(default=timezone.now)
     status = models.CharField(
         _("status"),
@@ -127,6 +209,14 @@ class UserMembership(models.Model):
         choices=RECURRING_INTERVAL_CHOICES,
         help_text=RECURRING_PAYMENT_INTERVAL_HELP_TEXT,
     )
+    successful_payment_count = models.PositiveIntegerField(
+        _("successful payments"), default=0, editable=False
+    )
+    next_billing_date = models.DateTimeField(
+        _("next billing date"), null=True, blank=True, db_index=True, editable=False
+    )
+
+    objects = UserMembershipQuerySet.as_manager()
 
     def get_display_recurring_price(self):
         return f"{dollar_format(self.get_recurring_price())} / {RECURRING_INTERVAL_TO_SPANISH.get(self.recurring_payment)}"
@@ -135,17 +225,28 @@ class UserMembership(models.Model):
         return self.recurring_price / 100
 
     def get_successful_payments(self):
-        return self.payment_set.count()
+        return self.successful_payment_count
 
-    @admin.display(description=_("Next Billing Date"))
-    def get_next_billing_date(self):
-        if not self.membership:
-            return "-"
+    def compute_next_billing_date(self):
         kwargs = {
-            f"{self.membership.recurring_payment}s": self.get_successful_payments()
+            f"{self.membership.recurring_payment}s": self.successful_payment_count
         }
-        next_billing_date = self.date_subscribed + relativedelta(**kwargs)
-        return date(next_billing_date)
+        return self.date_subscribed + relativedelta(**kwargs)
+
+    @admin.display(description=_("Next Billing Date"), ordering="next_billing_date")
+    def get_next_billing_date(self):
+        if not self.next_billing_date:
+            return "-"
+        return date(self.next_billing_date)
+
+    def save(self, *args, **kwargs):
+        self.next_billing_date = self.compute_next_billing_date()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "next_billing_date"}
+
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         if self.membership is not None:
@@ -156,3 +257,87 @@ class UserMembership(models.Model):
     class Meta:
         verbose_name = _("subscription")
         verbose_name_plural = _("subscriptions")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["external_subscription_id"],
+                condition=~models.Q(external_subscription_id=""),
+                name="unique_external_subscription_id",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["membership", "status"], name="sub_membership_status_idx"
+            ),
+            models.Index(fields=["user", "status"], name="sub_user_status_idx"),
+        ]
+
+
+class RepricingJob(models.Model):
+    """
+    A price change applied to many subscriptions in the background.
+
+    Each subscription is tracked by a ``RepricingItem``, so a job that failed
+    part way, or whose process died, can be resumed without touching the
+    subscriptions that were already updated.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (DONE, _("Done")),
+        (FAILED, _("Finished with errors")),
+    ]
+
+    new_price = models.IntegerField(_("price"), validators=[MinValueValidator(0)])
+    new_interval = models.CharField(
+        _("recurring interval"), max_length=30, choices=RECURRING_INTERVAL_CHOICES
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("repricing job")
+        verbose_name_plural = _("repricing jobs")
+
+    def get_progress(self) -> dict[str, int]:
+        counts = dict(
+            self.items.values_list("status").annotate(count=Count("pk")).order_by()
+        )
+        return {
+            "total": sum(counts.values()),
+            "pending": counts.get(RepricingItem.PENDING, 0),
+            "succeeded": counts.get(RepricingItem.SUCCEEDED, 0),
+            "failed": counts.get(RepricingItem.FAILED, 0),
+        }
+
+    def __str__(self) -> str:
+        return f"Repricing #{self.pk} to {dollar_format(self.new_price / 100)} / {self.new_interval}: {self.status}"
+
+
+class RepricingItem(models.Model):
+    PENDING = "pending"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, _("Pending")),
+        (SUCCEEDED, _("Succeeded")),
+        (FAILED, _("Failed")),
+    ]
+
+    job = models.ForeignKey(
+        RepricingJob, on_delete=models.CASCADE, related_name="items"
+    )
+    subscription = models.ForeignKey(UserMembership, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["job", "status"], name="repricing_item_status_idx"),
+        ]
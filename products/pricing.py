@@ -0,0 +1,76 @@
+import time
+from typing import Any
+
+from django.core.cache import cache
+
+from innovatix.core.templatetags.core_tags import dollar_format
+from products.models import Membership
+from products.services import payment_gateway
+
+PRICING_CACHE_KEY = "products:membership_pricing:{version}:{slug}"
+PRICING_VERSION_CACHE_KEY = "products:membership_pricing_version"
+PRICING_CACHE_TIMEOUT = 60 * 60
+
+
+def get_pricing_version() -> int:
+    return cache.get_or_set(PRICING_VERSION_CACHE_KEY, time.time_ns, None)
+
+
+def clear_pricing_cache() -> None:
+    """
+    Start a new version of the cached pricings; the old entries expire.
+    """
+    cache.set(PRICING_VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+def build_pricing(membership: Membership) -> dict[str, Any]:
+    """
+    Compute the checkout amounts of ``membership``, in cents, and their
+    display strings.
+    """
+    subtotal = membership.recurring_price + membership.entry_cost
+    service_fee = payment_gateway.calculate_service_fee(
+        membership.entry_cost
+    ) + payment_gateway.calculate_service_fee(membership.recurring_price)
+    total = subtotal + service_fee
+
+    return {
+        "membership": membership,
+        "subtotal": subtotal,
+        "service_fee": service_fee,
+        "total": total,
+        "display_subtotal": dollar_format(subtotal / 100),
+        "display_service_fee": dollar_format(service_fee / 100),
+        "display_total": dollar_format(total / 100),
+        "display_entry_cost": membership.get_display_entry_cost(),
+        "display_recurring_price": membership.get_display_recurring_price(),
+    }
+
+
+def get_pricing(slug: str) -> dict[str, Any] | None:
+    """
+    Return the pricing of the purchasable membership ``slug``, or ``None`` if
+    there is no such membership.
+
+    Pricings are kept in Django's cache, with the membership itself, so the
+    checkout pages of every worker render without a query until a Membership
+    is saved or deleted (see ``products.signals``). Each slug has its own
+    entry, under the current version: a pricing read before a price change
+    commits is stored under the old version, which is no longer read.
+
+    Only use the cached membership to display it; charge a fresh copy.
+    """
+    key = PRICING_CACHE_KEY.format(version=get_pricing_version(), slug=slug)
+    pricing = cache.get(key)
+
+    if pricing is None:
+        membership = Membership.objects.filter(slug=slug, is_purchasable=True).first()
+
+        # Misses are not cached, so new memberships show up right away.
+        if membership is None:
+            return None
+
+        pricing = build_pricing(membership)
+        cache.set(key, pricing, PRICING_CACHE_TIMEOUT)
+
+    return pricing
@@ -0,0 +1,183 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from products.models import RepricingItem, RepricingJob, UserMembership
+from products.resolvers import subscription_resolver
+from products.services import payment_gateway
+
+logger = logging.getLogger("django")
+
+# A running job that made no progress for this long was interrupted.
+STALE_JOB_TIMEOUT = timedelta(minutes=10)
+
+
+def create_repricing_job(
+    queryset: QuerySet[UserMembership],
+    new_price: int,
+    new_interval: str,
+    batch_size: int = 1000,
+) -> RepricingJob:
+    """
+    Create a job changing the price of every subscription of ``queryset``.
+
+    :param new_price: The new price, in cents.
+    """
+    with transaction.atomic():
+        job = RepricingJob.objects.create(
+            new_price=new_price, new_interval=new_interval
+        )
+        RepricingItem.objects.bulk_create(
+            (
+                RepricingItem(job=job, subscription_id=pk)
+                for pk in queryset.values_list("pk", flat=True).iterator()
+            ),
+            batch_size=batch_size,
+        )
+
+    return job
+
+
+def can_resume(job: RepricingJob) -> bool:
+    if job.status == RepricingJob.RUNNING:
+        return job.updated_at < timezone.now() - STALE_JOB_TIMEOUT
+
+    return job.status in [RepricingJob.PENDING, RepricingJob.FAILED]
+
+
+def claim_job(job: RepricingJob) -> bool:
+    """
+    Mark ``job`` as running if it can be resumed, with a single conditional
+    update, so concurrent resumes of the same job only run it once.
+
+    :return: Whether the job was claimed.
+    """
+    now = timezone.now()
+    claimed = RepricingJob.objects.filter(
+        Q(status__in=[RepricingJob.PENDING, RepricingJob.FAILED])
+        | Q(status=RepricingJob.RUNNING, updated_at__lt=now - STALE_JOB_TIMEOUT),
+        pk=job.pk,
+    ).update(status=RepricingJob.RUNNING, updated_at=now)
+
+    if claimed:
+        job.status, job.updated_at = RepricingJob.RUNNING, now
+
+    return bool(claimed)
+
+
+class SubscriptionRepricer:
+    """
+    Apply a repricing job: the Stripe subscriptions are modified by a pool of
+    threads, paced by the gateway's rate-limited scheduler, and each batch of
+    results is written locally with ``bulk_update``.
+
+    Only pending items are processed, so running a job again resumes it; on
+    resume, failed items are retried too.
+    """
+
+    def __init__(self, workers: int = 5, batch_size: int = 100):
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def update_subscription(self, item: RepricingItem) -> RepricingItem:
+        if payment_gateway.update_subscription(item.subscription):
+            item.status = RepricingItem.SUCCEEDED
+            item.error = ""
+        else:
+            item.status = RepricingItem.FAILED
+            item.error = "Stripe rejected the update; see the logs for details."
+
+        return item
+
+    def run_batch(self, job: RepricingJob, executor: ThreadPoolExecutor) -> int:
+        items = list(
+            job.items.filter(status=RepricingItem.PENDING).select_related(
+                "subscription__membership"
+            )[: self.batch_size]
+        )
+
+        for item in items:
+            item.subscription.recurring_price = job.new_price
+            item.subscription.recurring_payment = job.new_interval
+
+        items = list(executor.map(self.update_subscription, items))
+        updated = [
+            item.subscription
+            for item in items
+            if item.status == RepricingItem.SUCCEEDED
+        ]
+
+        with transaction.atomic():
+            UserMembership.objects.bulk_update(
+                updated, ["recurring_price", "recurring_payment"]
+            )
+            RepricingItem.objects.bulk_update(items, ["status", "error"])
+            # Also a heartbeat: it tells running jobs apart from interrupted ones.
+            RepricingJob.objects.filter(pk=job.pk).update(updated_at=timezone.now())
+
+        subscription_resolver.evict(
+            *(subscription.external_subscription_id for subscription in updated)
+        )
+
+        return len(items)
+
+    def run(self, job: RepricingJob) -> RepricingJob:
+        job.items.filter(status=RepricingItem.FAILED).update(
+            status=RepricingItem.PENDING, error=""
+        )
+        job.status = RepricingJob.RUNNING
+        job.finished_at = None
+        job.save(update_fields=["status", "finished_at", "updated_at"])
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while self.run_batch(job, executor):
+                    pass
+        except Exception as err:
+            logger.error(f"Repricing job {job.pk} stopped: {err}")
+            job.items.filter(status=RepricingItem.PENDING).update(
+                status=RepricingItem.FAILED, error=str(err)
+            )
+
+        job.status = (
+            RepricingJob.FAILED
+            if job.items.filter(status=RepricingItem.FAILED).exists()
+            else RepricingJob.DONE
+        )
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "finished_at", "updated_at"])
+
+        return job
+
+    def _run_in_thread(self, job_pk: int) -> None:
+        close_old_connections()
+        try:
+            self.run(RepricingJob.objects.get(pk=job_pk))
+        finally:
+            close_old_connections()
+
+    def start(self, job: RepricingJob) -> bool:
+        """
+        Claim ``job`` and run it in a background thread once the current
+        transaction commits. Jobs interrupted with the process are picked up
+        again by ``run_repricing_jobs`` or the resume button of the progress
+        page.
+
+        :return: Whether the job was started; it is not when it already runs.
+        """
+        if not claim_job(job):
+            return False
+
+        transaction.on_commit(
+            lambda: threading.Thread(
+                target=self._run_in_thread, args=(job.pk,), daemon=True
+            ).start()
+        )
+
+        return True
@@ -0,0 +1,5 @@
+from innovatix.core.resolvers import CachedResolver
+from products.models import Membership, UserMembership
+
+membership_resolver = CachedResolver(Membership, "external_product_id")
+subscription_resolver = CachedResolver(UserMembership, "external_subscription_id")
@@ -1,5 +1,18 @@
 from django.conf import settings
 
-from products.services.payment_gateways import StripePaymentGateway
+from innovatix.core.services.http_client import get_default_http_client
+from products.services.payment_gateways import (
+    AsyncStripePaymentGateway,
+    StripePaymentGateway,
+)
 
-payment_gateway = StripePaymentGateway(settings.STRIPE_SECRET_KEY)
+payment_gateway = StripePaymentGateway(
+    settings.STRIPE_SECRET_KEY,
+    getattr(settings, "STRIPE_WEBHOOK_SECRET", None),
+    http_client=get_default_http_client(),
+)
+async_payment_gateway = AsyncStripePaymentGateway(
+    settings.STRIPE_SECRET_KEY,
+    getattr(settings, "STRIPE_WEBHOOK_SECRET", None),
+    http_client=get_default_http_client(),
+)
@@ -1,19 +1,36 @@
+from __future__ import annotations
+
 import json
 import logging
 import math
-from typing import Any
+import warnings
+from typing import TYPE_CHECKING, Any
 
 import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponse
 from django.utils.html import strip_tags
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
 from innovatix.core.services.payment_gateways import CoreStripePaymentGateway
 from products.constants import INITIAL_PAYMENT_PRODUCT_NAME
 from products.models import Membership, UserMembership
 
+if TYPE_CHECKING:
+    from innovatix.users.models import CustomerUser
+
 logger = logging.getLogger("django")
 
+ENTRY_COST_PRODUCT_CACHE_KEY = "products:entry_cost_product_ids"
+ENTRY_COST_PRODUCT_CACHE_TIMEOUT = 60 * 60
+
+
+def clear_entry_cost_product_cache() -> None:
+    cache.delete(ENTRY_COST_PRODUCT_CACHE_KEY)
+
 
 class StripePaymentGateway(CoreStripePaymentGateway):
     """
@@ -24,12 +41,31 @@ class StripePaymentGateway(CoreStripePaymentGateway):
     TRANSACTION_FEE_CENTS = 30
 
     def entry_cost_product_id(self) -> str:
-        try:
-            return Membership.objects.get(
-                name=INITIAL_PAYMENT_PRODUCT_NAME
-            ).external_product_id
-        except Membership.DoesNotExist:
-            return ""
+        """
+        Return the Stripe ID of the entry cost product, or ``""`` if it does
+        not exist yet.
+
+        The ID is kept in Django's cache, so every worker shares it, until a
+        Membership is saved or deleted (see ``products.signals``).
+        """
+        # The product is looked up by its translated name, so IDs are cached
+        # per language.
+        product_ids = cache.get(ENTRY_COST_PRODUCT_CACHE_KEY) or {}
+        language = get_language()
+
+        if language not in product_ids:
+            product_ids[language] = (
+                Membership.objects.filter(name=INITIAL_PAYMENT_PRODUCT_NAME)
+                .values_list("external_product_id", flat=True)
+                .first()
+            ) or ""
+            cache.set(
+                ENTRY_COST_PRODUCT_CACHE_KEY,
+                product_ids,
+                ENTRY_COST_PRODUCT_CACHE_TIMEOUT,
+            )
+
+        return product_ids[language]
 
     def calculate_cost_with_fee(self, price: float) -> float:
         """
@@ -67,7 +103,9 @@ class StripePaymentGateway(CoreStripePaymentGateway):
         """
 
         try:
-            checkout_session = self.stripe.checkout.Session.create(
+            checkout_session = self.execute(
+                self.stripe.checkout.Session.create,
+                mutating=True,
                 line_items=line_items,
                 metadata=metadata,
                 phone_number_collection={
@@ -87,6 +125,7 @@ class StripePaymentGateway(CoreStripePaymentGateway):
         customer_id: str,
         payment_method_id: str,
         membership: Membership,
+        single_call: bool | None = None,
         **kwargs: dict[str, Any],
     ) -> dict[str, Any]:
         """
@@ -102,95 +141,190 @@ class StripePaymentGateway(CoreStripePaymentGateway):
         :param recurring_price_id: The ID of the price for the recurring charge in Stripe.
         :param payment_method_id: The ID of the payment method to use for the subscription.
         :param kwargs: Additional parameters, such as IP address and user agent.
+        :param single_call: Bill the entry cost with the subscription instead of
+            a separate InvoiceItem (see ``_get_single_call_subscription_data``).
+            Defaults to the ``STRIPE_SINGLE_CALL_CHECKOUT`` setting.
         :return: The status and client secret of the PaymentIntent.
         """
 
         try:
-            self.stripe.InvoiceItem.create(
-                customer=customer_id,
-                description="One-time setup fee",
-                price_data={
-                    "product": self.entry_cost_product_id(),
-                    "unit_amount": self.calculate_cost_with_fee(membership.entry_cost),
-                    "currency": "usd",
-                },
-            )
-
-            subscription = self.stripe.Subscription.create(
-                customer=customer_id,
-                items=[
-                    {
-                        "price_data": {
-                            "product": membership.external_product_id,
-                            "unit_amount": self.calculate_cost_with_fee(
-                                membership.recurring_price
-                            ),
-                            "currency": "usd",
-                            "recurring": {
-                                "interval": membership.recurring_payment,
-                            },
-                        }
-                    },
-                ],
-                payment_behavior="default_incomplete",
-                payment_settings={"save_default_payment_method": "on_subscription"},
-                expand=["latest_invoice.payment_intent"],
-            )
+            if self._use_single_call(single_call):
+                subscription = self.execute(
+                    self.stripe.Subscription.create,
+                    mutating=True,
+                    **self._get_single_call_subscription_data(
+                        customer_id, membership, self.entry_cost_product_id()
+                    ),
+                )
+            else:
+                self.execute(
+                    self.stripe.InvoiceItem.create,
+                    mutating=True,
+                    **self._get_entry_cost_item_data(
+                        customer_id, membership, self.entry_cost_product_id()
+                    ),
+                )
+
+                subscription = self.execute(
+                    self.stripe.Subscription.create,
+                    mutating=True,
+                    **self._get_subscription_data(customer_id, membership),
+                )
 
             # Confirm intent with collected payment method
-            payment_intent = self.stripe.PaymentIntent.confirm(
+            payment_intent = self.execute(
+                self.stripe.PaymentIntent.confirm,
                 subscription.latest_invoice.payment_intent.id,
-                payment_method=payment_method_id,
-                mandate_data={
-                    "customer_acceptance": {
-                        "type": "online",
-                        "online": {
-                            "ip_address": kwargs.get("ip_address"),
-                            "user_agent": kwargs.get("user_agent"),
-                        },
-                    },
-                },
+                mutating=True,
+                **self._get_confirm_data(payment_method_id, **kwargs),
             )
 
-            return {
-                "status": 200,
-                "client_secret": payment_intent.client_secret,
-                "message": "Payment succeeded",
-                "code": payment_intent.status,
-                "error": {
-                    "message": "There was an error processing your payment. Try again later."
-                },
-            }
+            return self._get_payment_response(payment_intent)
 
         except self.stripe.error.CardError as err:
-            return {
-                "status": err.http_status,
-                "client_secret": None,
-                "message": err.user_message,
-                "code": err.code,
-                "error": {"message": err.user_message},
-            }
+            return self._get_card_error_response(err)
 
         except self.stripe.error.InvalidRequestError as err:
             raise Exception(f"Invalid Request: {err.user_message}")
 
         except Exception as err:
             logger.error(f"Failed creating Stripe subscription: {err}")
+            return self._get_error_response(err)
+
+    def _get_entry_cost_item_data(
+        self, customer_id: str, membership: Membership, entry_cost_product_id: str
+    ) -> dict[str, Any]:
+        return {
+            "customer": customer_id,
+            "description": "One-time setup fee",
+            "price_data": {
+                "product": entry_cost_product_id,
+                "unit_amount": self.calculate_cost_with_fee(membership.entry_cost),
+                "currency": "usd",
+            },
+        }
+
+    def _get_subscription_data(
+        self, customer_id: str, membership: Membership
+    ) -> dict[str, Any]:
+        return {
+            "customer": customer_id,
+            "items": [
+                {
+                    "price_data": {
+                        "product": membership.external_product_id,
+                        "unit_amount": self.calculate_cost_with_fee(
+                            membership.recurring_price
+                        ),
+                        "currency": "usd",
+                        "recurring": {
+                            "interval": membership.recurring_payment,
+                        },
+                    }
+                },
+            ],
+            "payment_behavior": "default_incomplete",
+            "payment_settings": {"save_default_payment_method": "on_subscription"},
+            "expand": ["latest_invoice.payment_intent"],
+        }
+
+    def _use_single_call(self, single_call: bool | None) -> bool:
+        if single_call is None:
+            return getattr(settings, "STRIPE_SINGLE_CALL_CHECKOUT", False)
+
+        return single_call
+
+    def _get_single_call_subscription_data(
+        self,
+        customer_id: str,
+        membership: Membership,
+        entry_cost_product_id: str,
+    ) -> dict[str, Any]:
+        """
+        Parameters to create a subscription that bills its own entry cost.
+
+        The entry cost goes into ``add_invoice_items`` instead of a separate
+        InvoiceItem, so checkout takes one request less and no InvoiceItem is
+        left behind when the subscription fails. The first PaymentIntent is
+        still confirmed with the mandate data, like in the two-step flow.
+        """
+        entry_cost_item = self._get_entry_cost_item_data(
+            customer_id, membership, entry_cost_product_id
+        )
+
+        return {
+            **self._get_subscription_data(customer_id, membership),
+            "add_invoice_items": [{"price_data": entry_cost_item["price_data"]}],
+        }
+
+    def _get_confirm_data(
+        self, payment_method_id: str, **kwargs: dict[str, Any]
+    ) -> dict[str, Any]:
+        return {
+            "payment_method": payment_method_id,
+            "mandate_data": {
+                "customer_acceptance": {
+                    "type": "online",
+                    "online": {
+                        "ip_address": kwargs.get("ip_address"),
+                        "user_agent": kwargs.get("user_agent"),
+                    },
+                },
+            },
+        }
+
+    def _get_payment_response(
+        self, payment_intent: stripe.PaymentIntent
+    ) -> dict[str, Any]:
+        last_payment_error = payment_intent.get("last_payment_error")
+
+        # A declined card that did not raise CardError.
+        if payment_intent.status == "requires_payment_method" and last_payment_error:
             return {
-                "status": err.http_status,
+                "status": 402,
                 "client_secret": None,
-                "message": err.user_message,
-                "code": err.code,
-                "error": {
-                    "message": _(
-                        "There was an error processing your payment. Try again later."
-                    )
-                },
+                "message": last_payment_error.get("message"),
+                "code": last_payment_error.get("code", "card_declined"),
+                "error": {"message": last_payment_error.get("message")},
             }
 
+        return {
+            "status": 200,
+            "client_secret": payment_intent.client_secret,
+            "message": "Payment succeeded",
+            "code": payment_intent.status,
+            "error": {
+                "message": "There was an error processing your payment. Try again later."
+            },
+        }
+
+    def _get_card_error_response(self, err: stripe.error.CardError) -> dict[str, Any]:
+        return {
+            "status": err.http_status,
+            "client_secret": None,
+            "message": err.user_message,
+            "code": err.code,
+            "error": {"message": err.user_message},
+        }
+
+    def _get_error_response(self, err: Exception) -> dict[str, Any]:
+        return {
+            "status": err.http_status,
+            "client_secret": None,
+            "message": err.user_message,
+            "code": err.code,
+            "error": {
+                "message": _(
+                    "There was an error processing your payment. Try again later."
+                )
+            },
+        }
+
     def create_initial_payment_product(self, description: str) -> stripe.Product:
         try:
-            product = self.stripe.Product.create(
+            product = self.execute(
+                self.stripe.Product.create,
+                mutating=True,
                 name=INITIAL_PAYMENT_PRODUCT_NAME,
                 description=description,
             )
@@ -202,7 +336,9 @@ class StripePaymentGateway(CoreStripePaymentGateway):
 
     def create_membership(self, membership: Membership) -> stripe.Product:
         try:
-            product = self.stripe.Product.create(
+            product = self.execute(
+                self.stripe.Product.create,
+                mutating=True,
                 name=membership.name,
                 description=(
                     strip_tags(membership.short_description)
@@ -219,8 +355,10 @@ class StripePaymentGateway(CoreStripePaymentGateway):
 
     def update_membership(self, membership: Membership) -> stripe.Product:
         try:
-            return self.stripe.Product.modify(
+            return self.execute(
+                self.stripe.Product.modify,
                 membership.external_product_id,
+                mutating=True,
                 name=membership.name,
                 description=strip_tags(membership.short_description),
                 metadata={"type": "membership"},
@@ -234,38 +372,186 @@ class StripePaymentGateway(CoreStripePaymentGateway):
 
     def delete_membership(self, membership: Membership):
         try:
-            self.stripe.Product.delete(membership.external_product_id)
+            self.execute(
+                self.stripe.Product.delete,
+                membership.external_product_id,
+                mutating=True,
+            )
         except Exception as err:
             logger.error(f"Failed to delete membership from Stripe: {str(err)}")
             raise Exception(f"Failed to delete membership from Stripe: {str(err)}")
 
     def update_subscription(self, subscription: UserMembership):
         try:
-            return self.stripe.Subscription.modify(
+            return self.execute(
+                self.stripe.Subscription.modify,
                 subscription.external_subscription_id,
-                cancel_at_period_end=False,
-                proration_behavior="none",
-                items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product": subscription.membership.external_product_id,
-                            "unit_amount": subscription.recurring_price,
-                            "recurring": {"interval": subscription.recurring_payment},
-                        }
-                    },
-                ],
+                mutating=True,
+                **self._get_subscription_update_data(subscription),
             )
         except Exception as err:
             logger.error(f"Failed to updating subscription from Stripe: {str(err)}")
             return None
 
-    def construct_event(self, payload: dict) -> dict:
+    def _get_subscription_update_data(
+        self, subscription: UserMembership
+    ) -> dict[str, Any]:
+        return {
+            "cancel_at_period_end": False,
+            "proration_behavior": "none",
+            "items": [
+                {
+                    "price_data": {
+                        "currency": "usd",
+                        "product": subscription.membership.external_product_id,
+                        "unit_amount": subscription.recurring_price,
+                        "recurring": {"interval": subscription.recurring_payment},
+                    }
+                },
+            ],
+        }
+
+    def construct_event(
+        self, payload: bytes, sig_header: str | None = None
+    ) -> stripe.Event:
+        """
+        Build a ``stripe.Event`` from a webhook request, verifying its
+        ``Stripe-Signature`` header.
+
+        Calling it without ``sig_header`` is deprecated: the payload is then
+        decoded without any verification, as in previous versions.
+        """
         try:
-            event = self.stripe.Event.construct_from(
-                json.loads(payload), self.stripe.api_key
-            )
-            return event
+            if sig_header is None:
+                warnings.warn(
+                    "construct_event() without sig_header skips the signature "
+                    "check and is deprecated; pass the Stripe-Signature header.",
+                    DeprecationWarning,
+                    stacklevel=2,
+                )
+                data = json.loads(payload)
+            else:
+                data = self.parse_webhook(payload, sig_header)
+
+            return self.stripe.Event.construct_from(data, self.stripe.api_key)
         except Exception as err:
             logger.error(f"Failed to construct event from Stripe: {str(err)}")
             raise
+
+
+class AsyncStripePaymentGateway(StripePaymentGateway):
+    """
+    Stripe payment gateway with ``async`` versions of the checkout calls.
+
+    The coroutines use Stripe's ``*_async`` methods, so a worker running under
+    ASGI can keep many checkouts in flight at once instead of blocking a
+    thread on each round trip. Database reads needed to build the requests
+    run through ``sync_to_async``.
+    """
+
+    async def acreate_customer(self, obj: CustomerUser, **kwargs) -> stripe.Customer:
+        """
+        Create a Stripe customer.
+
+        :param obj: CustomerUser model instance.
+        """
+        data = await sync_to_async(self._get_customer_data)(obj, **kwargs)
+
+        return await self.aexecute(
+            self.stripe.Customer.create_async, mutating=True, **data
+        )
+
+    async def aupdate_customer(self, obj: CustomerUser) -> stripe.Customer:
+        """
+        Update Stripe customer, creating it if it does not exist yet.
+
+        :param obj: CustomerUser model instance.
+        """
+        try:
+            if not obj.external_customer_id:
+                return await self.acreate_customer(obj)
+
+            data = await sync_to_async(self._get_customer_data)(obj)
+
+            return await self.aexecute(
+                self.stripe.Customer.modify_async,
+                obj.external_customer_id,
+                mutating=True,
+                **data,
+            )
+        except Exception as e:
+            logger.error(f"Failed updating or creating Stripe customer: {e}")
+            raise
+
+    async def acreate_confirm_subscription(
+        self,
+        customer_id: str,
+        payment_method_id: str,
+        membership: Membership,
+        single_call: bool | None = None,
+        **kwargs: dict[str, Any],
+    ) -> dict[str, Any]:
+        """
+        Async version of ``create_confirm_subscription``.
+        """
+        entry_cost_product_id = await sync_to_async(self.entry_cost_product_id)()
+
+        try:
+            if self._use_single_call(single_call):
+                subscription = await self.aexecute(
+                    self.stripe.Subscription.create_async,
+                    mutating=True,
+                    **self._get_single_call_subscription_data(
+                        customer_id, membership, entry_cost_product_id
+                    ),
+                )
+            else:
+                await self.aexecute(
+                    self.stripe.InvoiceItem.create_async,
+                    mutating=True,
+                    **self._get_entry_cost_item_data(
+                        customer_id, membership, entry_cost_product_id
+                    ),
+                )
+
+                subscription = await self.aexecute(
+                    self.stripe.Subscription.create_async,
+                    mutating=True,
+                    **self._get_subscription_data(customer_id, membership),
+                )
+
+            payment_intent = await self.aexecute(
+                self.stripe.PaymentIntent.confirm_async,
+                subscription.latest_invoice.payment_intent.id,
+                mutating=True,
+                **self._get_confirm_data(payment_method_id, **kwargs),
+            )
+
+            return self._get_payment_response(payment_intent)
+
+        except self.stripe.error.CardError as err:
+            return self._get_card_error_response(err)
+
+        except self.stripe.error.InvalidRequestError as err:
+            raise Exception(f"Invalid Request: {err.user_message}")
+
+        except Exception as err:
+            logger.error(f"Failed creating Stripe subscription: {err}")
+            return self._get_error_response(err)
+
+    async def aupdate_subscription(self, subscription: UserMembership):
+        """
+        Async version of ``update_subscription``.
+        """
+        try:
+            data = await sync_to_async(self._get_subscription_update_data)(subscription)
+
+            return await self.aexecute(
+                self.stripe.Subscription.modify_async,
+                subscription.external_subscription_id,
+                mutating=True,
+                **data,
+            )
+        except Exception as err:
+            logger.error(f"Failed to updating subscription from Stripe: {str(err)}")
+            return None
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from products.models import Membership, UserMembership
+from products.pricing import clear_pricing_cache
+from products.services.payment_gateways import clear_entry_cost_product_cache
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def membership_changed(sender, **kwargs):
+    clear_entry_cost_product_cache()
+    clear_pricing_cache()
+    # Again on commit: a checkout page may have cached the old prices meanwhile.
+    transaction.on_commit(clear_pricing_cache)
+
+
+@receiver(pre_save, sender=Membership)
+def track_recurring_payment(sender, instance: Membership, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and "recurring_payment" not in update_fields
+    ):
+        instance._previous_recurring_payment = instance.recurring_payment
+        return
+
+    instance._previous_recurring_payment = (
+        Membership.objects.filter(pk=instance.pk)
+        .values_list("recurring_payment", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Membership)
+def refresh_membership_billing(sender, instance: Membership, created: bool, **kwargs):
+    # Next billing dates follow the recurring interval of the membership.
+    previous = getattr(instance, "_previous_recurring_payment", None)
+
+    if not created and previous != instance.recurring_payment:
+        transaction.on_commit(
+            UserMembership.objects.filter(membership=instance).refresh_billing
+        )
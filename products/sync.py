@@ -0,0 +1,387 @@
+import logging
+from datetime import datetime
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+import stripe
+from django.contrib.auth.hashers import make_password
+from django.db import models, transaction
+from django.utils import timezone
+
+from innovatix.core.resolvers import CachedResolver
+from innovatix.geo_territories.models import Country, Province
+from innovatix.users.models import CustomerUser, PartnerNumberSequence
+from innovatix.users.resolvers import customer_resolver
+from innovatix.users.webhook import get_sanitized_data
+from payments.models import Payment, PaymentMethod
+from payments.resolvers import payment_method_resolver
+from payments.webhook import get_payment_method_data
+from products.models import Membership, UserMembership
+from products.resolvers import subscription_resolver
+from products.services import payment_gateway
+
+logger = logging.getLogger("django")
+
+DEFAULT_BATCH_SIZE = 500
+
+CUSTOMER_UPDATE_FIELDS = [
+    "province",
+    "country",
+    "first_name",
+    "last_name",
+    "phone_number",
+    "address1",
+    "address2",
+    "city",
+    "zip",
+    "external_customer_id",
+]
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(iterable)
+
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def get_stripe_id(value: str | dict | None) -> str | None:
+    """
+    Return the ID of a Stripe reference, whether it was expanded or not.
+    """
+    if value is None or isinstance(value, str):
+        return value
+
+    return value["id"]
+
+
+def to_aware_datetime(timestamp: int) -> datetime:
+    return timezone.make_aware(datetime.fromtimestamp(timestamp))
+
+
+class StripeBulkSync:
+    """
+    Apply Stripe objects to the local database in batches.
+
+    Each batch prefetches the rows it touches by their Stripe ID, resolves
+    foreign keys from in-memory maps and writes with ``bulk_create`` and
+    ``bulk_update`` inside a single transaction, instead of running
+    ``update_or_create`` (plus its lookups) once per object.
+
+    Bulk writes send no model signals, so the rows they touch are evicted
+    from the shared resolvers by hand.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+        self.countries = {country.code: country for country in Country.objects.all()}
+        self.provinces = {
+            (province.code, province.country_id): province
+            for province in Province.objects.all()
+        }
+        self.memberships = {
+            membership.external_product_id: membership
+            for membership in Membership.objects.exclude(external_product_id="")
+        }
+        self.payment_method_cache: dict[str, stripe.PaymentMethod] = {}
+        self.written_payment_method_ids: set[str] = set()
+
+    def _upsert(
+        self,
+        model: type[models.Model],
+        key_field: str,
+        rows: dict[str, dict[str, Any]],
+        update_fields: list[str],
+        resolver: CachedResolver | None = None,
+    ) -> tuple[list[models.Model], list[models.Model]]:
+        """
+        Create or update one row per entry of ``rows``, keyed by ``key_field``.
+
+        :param resolver: Resolver keyed by ``key_field`` to evict the rows from.
+        """
+        existing = {
+            getattr(obj, key_field): obj
+            for obj in model.objects.filter(**{f"{key_field}__in": list(rows)})
+        }
+        to_create, to_update = [], []
+
+        for key, values in rows.items():
+            obj = existing.get(key)
+
+            if obj is None:
+                to_create.append(model(**values))
+                continue
+
+            for field, value in values.items():
+                setattr(obj, field, value)
+            to_update.append(obj)
+
+        with transaction.atomic():
+            model.objects.bulk_create(to_create)
+            model.objects.bulk_update(to_update, update_fields)
+
+        if resolver is not None:
+            resolver.evict(*rows)
+
+        return to_create, to_update
+
+    def _customers_by_stripe_id(self, stripe_ids: Iterable[str]) -> dict[str, Any]:
+        return customer_resolver.get_many(
+            stripe_id for stripe_id in stripe_ids if stripe_id
+        )
+
+    def sync_customers(self, stripe_customers: Iterable[stripe.Customer]) -> None:
+        for chunk in chunked(stripe_customers, self.batch_size):
+            rows = {}
+
+            for stripe_customer in chunk:
+                if not stripe_customer.email:
+                    continue
+
+                try:
+                    rows[stripe_customer.email] = get_sanitized_data(
+                        stripe_customer, self.countries, self.provinces
+                    )
+                except (Country.DoesNotExist, Province.DoesNotExist) as err:
+                    logger.warning(f"Skipping customer {stripe_customer.id}: {err}")
+
+            existing = {
+                customer.email: customer
+                for customer in CustomerUser.objects.filter(email__in=list(rows))
+            }
+            new_emails = [email for email in rows if email not in existing]
+            partner_numbers = dict(
+                zip(new_emails, PartnerNumberSequence.objects.reserve(len(new_emails)))
+            )
+            customers = []
+
+            for email, values in rows.items():
+                # Like the manager, Stripe-only customers get an unusable password.
+                customer = existing.get(email) or CustomerUser(
+                    partner_number=partner_numbers[email],
+                    password=make_password(None),
+                )
+                for field, value in values.items():
+                    setattr(customer, field, value)
+                customer.phone_number = customer.format_phone_number()
+                customers.append(customer)
+
+            with transaction.atomic():
+                CustomerUser.objects.bulk_create(
+                    [customer for customer in customers if customer.pk is None],
+                    update_conflicts=True,
+                    unique_fields=["email"],
+                    update_fields=CUSTOMER_UPDATE_FIELDS,
+                )
+                CustomerUser.objects.bulk_update(
+                    [customer for customer in customers if customer.pk is not None],
+                    CUSTOMER_UPDATE_FIELDS,
+                )
+
+            customer_resolver.evict(
+                *(customer.external_customer_id for customer in customers)
+            )
+
+    def delete_customers(self, stripe_customer_ids: Iterable[str]) -> None:
+        for chunk in chunked(stripe_customer_ids, self.batch_size):
+            with transaction.atomic():
+                CustomerUser.objects.filter(external_customer_id__in=chunk).delete()
+
+    def sync_subscriptions(
+        self, stripe_subscriptions: Iterable[stripe.Subscription]
+    ) -> None:
+        for chunk in chunked(stripe_subscriptions, self.batch_size):
+            customers = self._customers_by_stripe_id(
+                subscription.customer for subscription in chunk
+            )
+            rows = {}
+
+            for stripe_subscription in chunk:
+                plan = stripe_subscription.get("plan") or {}
+                customer = customers.get(stripe_subscription.customer)
+                membership = self.memberships.get(plan.get("product"))
+
+                if customer is None or membership is None:
+                    logger.warning(
+                        f"Skipping subscription {stripe_subscription.id}: unknown customer or product."
+                    )
+                    continue
+
+                rows[stripe_subscription.id] = {
+                    "external_subscription_id": stripe_subscription.id,
+                    "user": customer,
+                    "membership": membership,
+                    "recurring_price": plan.get("amount"),
+                    "recurring_payment": plan.get("interval"),
+                    "status": stripe_subscription.status,
+                    "date_subscribed": to_aware_datetime(stripe_subscription.created),
+                }
+
+            self._upsert(
+                UserMembership,
+                "external_subscription_id",
+                rows,
+                [
+                    "user",
+                    "membership",
+                    "recurring_price",
+                    "recurring_payment",
+                    "status",
+                    "date_subscribed",
+                ],
+                subscription_resolver,
+            )
+            UserMembership.objects.filter(
+                external_subscription_id__in=list(rows)
+            ).refresh_billing()
+
+    def resolve_payment_method(
+        self, stripe_payment_intent: stripe.PaymentIntent
+    ) -> stripe.PaymentMethod | None:
+        """
+        Return the payment method of an intent, retrieving each one at most
+        once per run.
+
+        Intents listed with ``expand=["data.payment_method"]`` already carry
+        the full object and never hit the API.
+        """
+        payment_method = stripe_payment_intent.get("payment_method")
+
+        if not payment_method:
+            return None
+        if not isinstance(payment_method, str):
+            return payment_method
+        if payment_method not in self.payment_method_cache:
+            self.payment_method_cache[payment_method] = payment_gateway.execute(
+                stripe.PaymentMethod.retrieve, payment_method
+            )
+
+        return self.payment_method_cache[payment_method]
+
+    def _apply_payment_methods(self, chunk: list[stripe.PaymentIntent]) -> None:
+        customers = self._customers_by_stripe_id(intent.customer for intent in chunk)
+        rows = {}
+
+        for stripe_payment_intent in chunk:
+            customer = customers.get(stripe_payment_intent.customer)
+
+            payment_method_id = get_stripe_id(
+                stripe_payment_intent.get("payment_method")
+            )
+
+            if (
+                customer is None
+                or payment_method_id is None
+                or payment_method_id in self.written_payment_method_ids
+                or payment_method_id in rows
+            ):
+                continue
+
+            stripe_payment_method = self.resolve_payment_method(stripe_payment_intent)
+            rows[payment_method_id] = get_payment_method_data(
+                stripe_payment_method, customer
+            )
+
+        self._upsert(
+            PaymentMethod,
+            "external_payment_method_id",
+            rows,
+            [
+                "user",
+                "card_name",
+                "type",
+                "last_four",
+                "expiration_month",
+                "expiration_year",
+            ],
+            payment_method_resolver,
+        )
+        self.written_payment_method_ids.update(rows)
+
+    def _apply_payments(self, chunk: list[stripe.PaymentIntent]) -> None:
+        payment_method_ids = {
+            stripe_payment.id: get_stripe_id(stripe_payment.get("payment_method"))
+            for stripe_payment in chunk
+        }
+        payment_methods = payment_method_resolver.get_many(
+            payment_method_id
+            for payment_method_id in payment_method_ids.values()
+            if payment_method_id
+        )
+        rows = {
+            stripe_payment.id: {
+                "external_payment_id": stripe_payment.id,
+                "description": stripe_payment.description,
+                "payment_method": payment_methods.get(
+                    payment_method_ids[stripe_payment.id]
+                ),
+                "subtotal": stripe_payment.amount,
+                "tax": 0,
+                "total": stripe_payment.amount,
+                "status": stripe_payment.status,
+                "date": to_aware_datetime(stripe_payment.created),
+            }
+            for stripe_payment in chunk
+        }
+
+        self._upsert(
+            Payment,
+            "external_payment_id",
+            rows,
+            [
+                "description",
+                "payment_method",
+                "subtotal",
+                "tax",
+                "total",
+                "status",
+                "date",
+            ],
+        )
+
+    def sync_payment_intents(
+        self, stripe_payment_intents: Iterable[stripe.PaymentIntent]
+    ) -> None:
+        """
+        Apply payment methods and payments from a single PaymentIntent crawl.
+        """
+        for chunk in chunked(stripe_payment_intents, self.batch_size):
+            self._apply_payment_methods(chunk)
+            self._apply_payments(chunk)
+
+    def sync_invoices(self, stripe_invoices: Iterable[stripe.Invoice]) -> None:
+        for chunk in chunked(stripe_invoices, self.batch_size):
+            payments = {
+                payment.external_payment_id: payment
+                for payment in Payment.objects.filter(
+                    external_payment_id__in={
+                        invoice.payment_intent for invoice in chunk
+                    }
+                )
+            }
+            subscriptions = subscription_resolver.get_many(
+                invoice.subscription for invoice in chunk if invoice.subscription
+            )
+            to_update, subscription_ids = [], set()
+
+            for stripe_invoice in chunk:
+                payment = payments.get(stripe_invoice.payment_intent)
+
+                if payment is None:
+                    continue
+
+                # Both the previous and the new subscription change counts.
+                subscription_ids.add(payment.user_membership_id)
+                payment.user_membership = subscriptions.get(stripe_invoice.subscription)
+                subscription_ids.add(payment.user_membership_id)
+                payment.subtotal = stripe_invoice.subtotal or 0
+                payment.tax = stripe_invoice.tax or 0
+                payment.total = stripe_invoice.total or 0
+                to_update.append(payment)
+
+            with transaction.atomic():
+                Payment.objects.bulk_update(
+                    to_update, ["user_membership", "subtotal", "tax", "total"]
+                )
+                UserMembership.objects.filter(pk__in=subscription_ids).refresh_billing()
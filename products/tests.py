@@ -1,16 +1,44 @@
-from unittest.mock import patch
+from io import StringIO
+from unittest.mock import ANY, patch
+
+import stripe
+from dateutil.relativedelta import relativedelta
 
 from django.contrib.admin.sites import AdminSite
 from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.http import HttpRequest
+from django.core.management import call_command
+from django.http import HttpRequest, QueryDict
 from django.test import TestCase
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from innovatix.core.models import SyncState
 from innovatix.core.tests import BaseTestCase
 from innovatix.geo_territories.utils import get_default_country, get_default_province
+from innovatix.users.models import CustomerUser
 from innovatix.users.utils import create_fake_customer_user
+from payments.models import Payment, PaymentMethod
+from payments.utils import create_fake_payment
 from products.admin import UserMembershipAdmin
-from products.models import UserMembership
+from products.constants import INITIAL_PAYMENT_PRODUCT_NAME
+from products.forms import MembershipPriceChangeForm
+from products.models import Membership, RepricingJob, UserMembership
+from products.pricing import (
+    PRICING_CACHE_KEY,
+    clear_pricing_cache,
+    get_pricing,
+    get_pricing_version,
+)
+from products.repricing import (
+    STALE_JOB_TIMEOUT,
+    SubscriptionRepricer,
+    can_resume,
+    create_repricing_job,
+)
+from products.services import payment_gateway
+from products.services.payment_gateways import clear_entry_cost_product_cache
+from products.sync import StripeBulkSync
 from products.utils import create_fake_membership, create_fake_subscription
 
 
@@ -23,6 +51,173 @@ class MembershipModelTest(TestCase):
         self.assertEqual(self.membership.get_recurring_price(), 10.49)
 
 
+class EntryCostProductIdTest(TestCase):
+    def setUp(self):
+        clear_entry_cost_product_cache()
+        self.membership = create_fake_membership(
+            name=INITIAL_PAYMENT_PRODUCT_NAME, external_product_id="prod_entry"
+        )
+
+    def test_cached_until_membership_changes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(payment_gateway.entry_cost_product_id(), "prod_entry")
+            self.assertEqual(payment_gateway.entry_cost_product_id(), "prod_entry")
+
+        self.membership.external_product_id = "prod_new_entry"
+        self.membership.save()
+
+        self.assertEqual(payment_gateway.entry_cost_product_id(), "prod_new_entry")
+
+        self.membership.delete()
+
+        self.assertEqual(payment_gateway.entry_cost_product_id(), "")
+
+
+class MembershipPricingTest(TestCase):
+    def setUp(self):
+        clear_pricing_cache()
+        self.membership = create_fake_membership()
+
+    def test_pricing_is_cached(self):
+        with self.assertNumQueries(1):
+            pricing = get_pricing(self.membership.slug)
+            self.assertEqual(get_pricing(self.membership.slug), pricing)
+
+        self.assertEqual(pricing["membership"], self.membership)
+        self.assertEqual(pricing["subtotal"], 1549)
+        self.assertEqual(
+            pricing["service_fee"],
+            payment_gateway.calculate_service_fee(500)
+            + payment_gateway.calculate_service_fee(1049),
+        )
+        self.assertEqual(pricing["total"], 1549 + pricing["service_fee"])
+        self.assertEqual(pricing["display_subtotal"], "$15.49")
+
+    def test_price_change_clears_pricing(self):
+        get_pricing(self.membership.slug)
+
+        form = MembershipPriceChangeForm(
+            {"entry_cost": "0", "recurring_price": "20", "recurring_payment": "month"},
+            instance=self.membership,
+        )
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        self.assertEqual(get_pricing(self.membership.slug)["subtotal"], 2000)
+
+    def test_pricing_read_before_a_change_is_not_kept(self):
+        version, stale = get_pricing_version(), get_pricing(self.membership.slug)
+        clear_pricing_cache()
+        # A request that read the pricing before the change stores it late.
+        cache.set(
+            PRICING_CACHE_KEY.format(version=version, slug=self.membership.slug), stale
+        )
+        Membership.objects.filter(pk=self.membership.pk).update(recurring_price=2000)
+
+        self.assertEqual(get_pricing(self.membership.slug)["subtotal"], 2500)
+
+    def test_pricing_of_unpurchasable_membership(self):
+        self.membership.is_purchasable = False
+        self.membership.save()
+
+        self.assertIsNone(get_pricing(self.membership.slug))
+        self.assertIsNone(get_pricing("missing"))
+
+
+class StripePaymentGatewayTest(TestCase):
+    def setUp(self):
+        self.membership = create_fake_membership()
+
+    def create_confirm_subscription(self):
+        return payment_gateway.create_confirm_subscription(
+            customer_id="cus_1",
+            payment_method_id="pm_1",
+            membership=self.membership,
+            single_call=True,
+            ip_address="127.0.0.1",
+            user_agent="Test",
+        )
+
+    @patch("stripe.InvoiceItem.create")
+    @patch("stripe.PaymentIntent.confirm")
+    @patch("stripe.Subscription.create")
+    def test_single_call_checkout(
+        self, mock_subscription_create, mock_confirm, mock_invoice_item_create
+    ):
+        mock_subscription_create.return_value = construct_stripe_object(
+            stripe.Subscription,
+            id="sub_1",
+            latest_invoice={"payment_intent": {"id": "pi_1"}},
+        )
+        mock_confirm.return_value = construct_stripe_object(
+            stripe.PaymentIntent,
+            id="pi_1",
+            client_secret="pi_secret",
+            status="succeeded",
+        )
+
+        response = self.create_confirm_subscription()
+
+        self.assertEqual(response["code"], "succeeded")
+        self.assertEqual(response["client_secret"], "pi_secret")
+        mock_invoice_item_create.assert_not_called()
+        params = mock_subscription_create.call_args.kwargs
+        self.assertEqual(
+            params["add_invoice_items"][0]["price_data"]["unit_amount"],
+            payment_gateway.calculate_cost_with_fee(self.membership.entry_cost),
+        )
+        self.assertEqual(
+            mock_confirm.call_args.kwargs["mandate_data"]["customer_acceptance"][
+                "online"
+            ],
+            {"ip_address": "127.0.0.1", "user_agent": "Test"},
+        )
+
+    @patch("stripe.PaymentIntent.confirm")
+    @patch("stripe.Subscription.create")
+    def test_single_call_checkout_declined_card(
+        self, mock_subscription_create, mock_confirm
+    ):
+        mock_subscription_create.return_value = construct_stripe_object(
+            stripe.Subscription,
+            id="sub_1",
+            latest_invoice={"payment_intent": {"id": "pi_1"}},
+        )
+        mock_confirm.side_effect = stripe.error.CardError(
+            "Your card was declined.", None, "card_declined", http_status=402
+        )
+
+        response = self.create_confirm_subscription()
+
+        self.assertEqual(response["code"], "card_declined")
+        self.assertEqual(response["error"]["message"], "Your card was declined.")
+
+    def test_payment_response_of_declined_payment_intent(self):
+        response = payment_gateway._get_payment_response(
+            construct_stripe_object(
+                stripe.PaymentIntent,
+                id="pi_1",
+                client_secret="pi_secret",
+                status="requires_payment_method",
+                last_payment_error={
+                    "code": "card_declined",
+                    "message": "Your card was declined.",
+                },
+            )
+        )
+
+        self.assertEqual(response["code"], "card_declined")
+        self.assertEqual(response["error"]["message"], "Your card was declined.")
+
+    def test_construct_event_without_signature_is_deprecated(self):
+        payload = b'{"id": "evt_1", "object": "event", "type": "product.deleted"}'
+
+        with self.assertWarns(DeprecationWarning):
+            event = payment_gateway.construct_event(payload)
+
+        self.assertEqual(event.id, "evt_1")
+
+
 class UserMembershipModelTest(BaseTestCase):
     def setUp(self):
         self.country = get_default_country()
@@ -34,6 +229,79 @@ class UserMembershipModelTest(BaseTestCase):
     def test_user_membership_creation(self):
         self.assertEqual(self.user_membership.user, self.user)
         self.assertEqual(self.user_membership.membership, self.membership)
+        self.assertEqual(
+            self.user_membership.next_billing_date,
+            self.user_membership.date_subscribed,
+        )
+
+    def test_refresh_billing(self):
+        create_fake_payment(self.user_membership)
+        create_fake_payment(self.user_membership)
+
+        with self.assertNumQueries(2):
+            UserMembership.objects.filter(pk=self.user_membership.pk).refresh_billing()
+
+        self.user_membership.refresh_from_db()
+        self.assertEqual(self.user_membership.get_successful_payments(), 2)
+        self.assertEqual(
+            self.user_membership.next_billing_date,
+            self.user_membership.date_subscribed + relativedelta(months=2),
+        )
+
+    def test_only_interval_changes_refresh_billing(self):
+        UserMembership.objects.update(next_billing_date=None)
+        self.membership.description = "Changed"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.save()
+
+        self.user_membership.refresh_from_db()
+        self.assertIsNone(self.user_membership.next_billing_date)
+
+        self.membership.recurring_payment = "year"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.save()
+
+        self.user_membership.refresh_from_db()
+        self.assertIsNotNone(self.user_membership.next_billing_date)
+
+    def test_backfill_billing(self):
+        create_fake_payment(self.user_membership)
+        UserMembership.objects.update(next_billing_date=None)
+
+        call_command("backfill_billing", stdout=StringIO())
+
+        self.user_membership.refresh_from_db()
+        self.assertEqual(self.user_membership.successful_payment_count, 1)
+        self.assertIsNotNone(self.user_membership.next_billing_date)
+
+    def test_membership_subscription_counts(self):
+        create_fake_subscription(
+            self.user,
+            self.membership,
+            external_subscription_id="sub_2",
+            status="canceled",
+        )
+        unused = create_fake_membership(
+            external_product_id="prod_unused", slug="unused-membership"
+        )
+
+        with self.assertNumQueries(1):
+            memberships = {
+                membership.pk: (
+                    membership.is_linked_to_subscriptions(),
+                    membership.get_subcriptions_count(),
+                    membership.active_subscription_count,
+                )
+                for membership in Membership.objects.with_subscription_counts()
+            }
+
+        self.assertEqual(
+            memberships, {self.membership.pk: (True, 2, 1), unused.pk: (False, 0, 0)}
+        )
+        self.assertTrue(self.membership.is_linked_to_subscriptions())
+        self.assertEqual(self.membership.get_subcriptions_count(), 2)
 
 
 class MockRequest(HttpRequest):
@@ -55,6 +323,7 @@ class UserMembershipAdminTestCase(BaseTestCase):
         self.admin = UserMembershipAdmin(UserMembership, self.site)
         self.membership1 = create_fake_membership()
         self.membership2 = create_fake_membership(
+            external_product_id="prod_membership2",
             name="Test Membership 2",
             slug="test-membership-2",
             recurring_price=2000,
@@ -70,11 +339,19 @@ class UserMembershipAdminTestCase(BaseTestCase):
             email="customer2@example.com",
         )
         self.subscription1 = create_fake_subscription(self.customer1, self.membership1)
-        self.subscription2 = create_fake_subscription(self.customer2, self.membership2)
+        self.subscription2 = create_fake_subscription(
+            self.customer2, self.membership2, external_subscription_id="sub_2"
+        )
 
     def test_has_delete_permission(self):
         self.assertFalse(self.admin.has_delete_permission(request))
 
+    def test_changelist_joins_user_and_membership(self):
+        queryset = self.admin.get_queryset(request)
+
+        with self.assertNumQueries(1):
+            [str(subscription) for subscription in queryset]
+
     def test_has_add_permission(self):
         self.assertFalse(self.admin.has_add_permission(request))
 
@@ -102,8 +379,20 @@ class UserMembershipAdminTestCase(BaseTestCase):
         messages = FallbackStorage(request)
         setattr(request, "_messages", messages)
 
-        # Call the update_price method
-        self.admin.update_price(request, queryset)
+        # Call the update_price method; the job it starts runs after the commit
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.admin.update_price(request, queryset)
+
+        job = RepricingJob.objects.get()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            response.url,
+            reverse("admin:products_usermembership_repricing", args=[job.pk]),
+        )
+        SubscriptionRepricer(workers=2).run(job)
+
+        self.assertEqual(job.status, RepricingJob.DONE)
+        self.assertEqual(job.get_progress()["succeeded"], 2)
 
         # Reload objects from database and check that prices were updated
         self.subscription1.refresh_from_db()
@@ -116,6 +405,65 @@ class UserMembershipAdminTestCase(BaseTestCase):
         )  # New price in dollars
         self.assertEqual(self.subscription2.recurring_payment, "year")  # New interval
 
+    @patch("products.admin.render")
+    def test_update_price_form_uses_price_distribution(self, mock_render):
+        create_fake_subscription(
+            self.customer2, self.membership2, external_subscription_id="sub_3"
+        )
+        form_request = HttpRequest()
+        form_request.POST = QueryDict("select_across=1")
+
+        # One GROUP BY query; the preview of the selection is only a slice.
+        with self.assertNumQueries(1):
+            self.admin.update_price(form_request, UserMembership.objects.all())
+
+        context = mock_render.call_args.kwargs["context"]
+        self.assertEqual(context["form"].initial, {"new_price": 20.00})
+        self.assertEqual(context["count"], 3)
+        self.assertEqual(context["select_across"], "1")
+        self.assertEqual(
+            [(row["count"], row["percent"]) for row in context["price_distribution"]],
+            [(2, 67), (1, 33)],
+        )
+
+    @patch("products.services.payment_gateway.update_subscription")
+    def test_failed_repricing_can_be_resumed(self, mock_update_subscription):
+        mock_update_subscription.side_effect = [None, {"object": "subscription"}]
+        job = create_repricing_job(
+            UserMembership.objects.filter(pk=self.subscription1.pk), 3000, "year"
+        )
+
+        SubscriptionRepricer(workers=1).run(job)
+        self.assertEqual(job.status, RepricingJob.FAILED)
+        self.assertTrue(can_resume(job))
+
+        SubscriptionRepricer(workers=1).run(job)
+        self.assertEqual(job.status, RepricingJob.DONE)
+        self.subscription1.refresh_from_db()
+        self.assertEqual(self.subscription1.recurring_price, 3000)
+
+    def test_jobs_are_only_started_once(self):
+        job = create_repricing_job(
+            UserMembership.objects.filter(pk=self.subscription1.pk), 3000, "year"
+        )
+        repricer = SubscriptionRepricer()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(repricer.start(job))
+            self.assertFalse(repricer.start(RepricingJob.objects.get(pk=job.pk)))
+
+        self.assertEqual(len(callbacks), 1)
+
+        # Interrupted jobs can be claimed again.
+        RepricingJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - STALE_JOB_TIMEOUT * 2
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(repricer.start(job))
+
+        self.assertEqual(len(callbacks), 1)
+
 
 class CustomerInfoPageViewTest(BaseTestCase):
     def setUp(self):
@@ -156,3 +504,163 @@ class CustomerInfoPageViewTest(BaseTestCase):
                 "payments:payment-info", kwargs={"slug": self.membership.slug}
             ),
         )
+
+
+def construct_stripe_object(resource: type, **values) -> stripe.StripeObject:
+    return resource.construct_from(values, "sk_test")
+
+
+class StripeBulkSyncTest(BaseTestCase):
+    def setUp(self):
+        self.membership = create_fake_membership()
+        self.existing_user = create_fake_customer_user(
+            get_default_province(), get_default_country()
+        )
+        self.bulk_sync = StripeBulkSync(batch_size=2)
+
+    def sync_customers(self):
+        return self.bulk_sync.sync_customers(
+            construct_stripe_object(
+                stripe.Customer,
+                id=f"cus_{index}",
+                email=email,
+                name="Test Customer",
+                phone="",
+                address=None,
+                metadata={},
+            )
+            for index, email in enumerate(
+                [self.existing_user.email, "new1@example.com", "new2@example.com"]
+            )
+        )
+
+    def test_sync_customers(self):
+        password = self.existing_user.password
+        self.sync_customers()
+
+        self.existing_user.refresh_from_db()
+        self.assertEqual(self.existing_user.external_customer_id, "cus_0")
+        new_users = CustomerUser.objects.filter(
+            external_customer_id__in=["cus_1", "cus_2"]
+        )
+        self.assertEqual(new_users.count(), 2)
+        self.assertEqual(len({user.partner_number for user in new_users}), 2)
+        self.assertFalse(any(user.has_usable_password() for user in new_users))
+        self.assertEqual(self.existing_user.password, password)
+
+    @patch("stripe.PaymentMethod.retrieve")
+    def test_sync_subscriptions_payments_and_invoices(self, mock_retrieve):
+        mock_retrieve.return_value = construct_stripe_object(
+            stripe.PaymentMethod,
+            id="pm_1",
+            billing_details={"name": "Test Customer"},
+            card={"brand": "visa", "last4": "4242", "exp_month": 1, "exp_year": 2030},
+        )
+        self.sync_customers()
+        payment_intents = [
+            construct_stripe_object(
+                stripe.PaymentIntent,
+                id=f"pi_{index}",
+                customer="cus_1",
+                payment_method="pm_1",
+                description="Subscription",
+                amount=1049,
+                status="succeeded",
+                created=1700000000,
+            )
+            for index in range(3)
+        ]
+
+        self.bulk_sync.sync_payment_intents(payment_intents)
+        self.bulk_sync.sync_subscriptions(
+            [
+                construct_stripe_object(
+                    stripe.Subscription,
+                    id="sub_1",
+                    customer="cus_1",
+                    status="active",
+                    created=1700000000,
+                    plan={
+                        "product": "prod_membership1",
+                        "amount": 1049,
+                        "interval": "month",
+                    },
+                )
+            ]
+        )
+        self.bulk_sync.sync_invoices(
+            [
+                construct_stripe_object(
+                    stripe.Invoice,
+                    id="in_1",
+                    payment_intent="pi_0",
+                    subscription="sub_1",
+                    subtotal=1049,
+                    tax=None,
+                    total=1049,
+                )
+            ]
+        )
+
+        mock_retrieve.assert_called_once_with("pm_1")
+        self.assertEqual(PaymentMethod.objects.count(), 1)
+        subscription = UserMembership.objects.get(external_subscription_id="sub_1")
+        self.assertEqual(subscription.user.external_customer_id, "cus_1")
+        self.assertEqual(
+            Payment.objects.filter(payment_method__isnull=False).count(), 3
+        )
+        self.assertEqual(
+            Payment.objects.get(external_payment_id="pi_0").user_membership,
+            subscription,
+        )
+
+
+class SyncStripeDataCommandTest(BaseTestCase):
+    def setUp(self):
+        self.user = create_fake_customer_user(
+            get_default_province(), get_default_country()
+        )
+        self.stripe_pages = {
+            "Customer": [],
+            "Subscription": [],
+            "PaymentIntent": [],
+            "Invoice": [],
+            "Event": [
+                [
+                    construct_stripe_object(
+                        stripe.Event,
+                        type="customer.updated",
+                        data={
+                            "object": {
+                                "id": "cus_1",
+                                "object": "customer",
+                                "email": self.user.email,
+                                "name": "Updated Name",
+                                "phone": "",
+                                "address": None,
+                                "metadata": {},
+                            }
+                        },
+                    )
+                ]
+            ],
+        }
+
+    def fake_iter_pages(self, resource, throttle=None, **kwargs):
+        return iter(self.stripe_pages[resource])
+
+    @patch("products.services.payment_gateway._iter_pages")
+    def test_incremental_sync(self, mock_iter_pages):
+        mock_iter_pages.side_effect = self.fake_iter_pages
+        SyncState.mark("Customer", 1700000000)
+
+        call_command("sync_stripe_data", incremental=True)
+
+        mock_iter_pages.assert_any_call(
+            "Customer", throttle=ANY, limit=100, created={"gte": 1700000000}
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.external_customer_id, "cus_1")
+        self.assertEqual(self.user.first_name, "Updated")
+        self.assertGreater(SyncState.get_high_water_mark("Customer"), 1700000000)
+        self.assertIsNotNone(SyncState.get_high_water_mark("Event"))
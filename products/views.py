@@ -1,5 +1,6 @@
 from typing import Any
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.db.models.query import QuerySet
 from django.http import Http404
@@ -11,31 +12,33 @@ from innovatix.core.views import CoreListView
 from innovatix.users.forms import CustomerInfoForm
 from innovatix.users.models import CustomerUser
 from products.models import Membership
-from products.services import payment_gateway
+from products.pricing import get_pricing
 
 
 class MembershipInfoMixin:
     def setup(self, request, *args, **kwargs):
         super().setup(request, *args, **kwargs)
-        try:
-            self.membership: Membership = Membership.objects.get(
-                slug=kwargs["slug"], is_purchasable=True
-            )
-        except Membership.DoesNotExist:
+        self.set_pricing(get_pricing(kwargs["slug"]))
+
+    def set_pricing(self, pricing: dict[str, Any] | None):
+        """
+        Use the cached pricing of the membership, see ``products.pricing``.
+        """
+        if pricing is None:
             raise Http404("No Membership matches the given query.")
-        self.subtotal: int = (
-            self.membership.recurring_price + self.membership.entry_cost
-        )
-        self.service_fee = payment_gateway.calculate_service_fee(
-            self.membership.entry_cost
-        ) + payment_gateway.calculate_service_fee(self.membership.recurring_price)
-        self.total = self.subtotal + self.service_fee
+
+        self.pricing = pricing
+        self.membership: Membership = pricing["membership"]
+        self.subtotal: int = pricing["subtotal"]
+        self.service_fee = pricing["service_fee"]
+        self.total = pricing["total"]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update(
             {
                 "membership": self.membership,
+                "pricing": self.pricing,
                 "subtotal": self.subtotal,
                 "service_fee": self.service_fee,
                 "total": self.total,
@@ -44,6 +47,20 @@ class MembershipInfoMixin:
         return context
 
 
+class AsyncMembershipInfoMixin(MembershipInfoMixin):
+    """
+    ``MembershipInfoMixin`` for async views: ``setup`` runs on the event loop,
+    where the ORM cannot be used synchronously, so the membership is loaded
+    with ``aload_membership`` from the async ``dispatch`` instead.
+    """
+
+    def setup(self, request, *args, **kwargs):
+        super(MembershipInfoMixin, self).setup(request, *args, **kwargs)
+
+    async def aload_membership(self):
+        self.set_pricing(await sync_to_async(get_pricing)(self.kwargs["slug"]))
+
+
 @method_decorator(login_required, name="dispatch")
 class CustomerInfoUpdateView(MembershipInfoMixin, UpdateView):
     model = CustomerUser
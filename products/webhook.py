@@ -3,8 +3,10 @@ from typing import Any
 
 import stripe
 
-from innovatix.users.models import CustomerUser
+from innovatix.users.resolvers import customer_resolver
 from products.models import Membership, UserMembership
+from products.resolvers import membership_resolver
+from products.services.payment_gateways import clear_entry_cost_product_cache
 
 logger = logging.getLogger("django")
 
@@ -16,12 +18,8 @@ def handle_update_or_create(
     return UserMembership.objects.update_or_create(
         external_subscription_id=stripe_subscription.id,
         defaults={
-            "user": CustomerUser.objects.get(
-                external_customer_id=stripe_subscription.customer
-            ),
-            "membership": Membership.objects.get(
-                external_product_id=plan.get("product")
-            ),
+            "user": customer_resolver.get(stripe_subscription.customer),
+            "membership": membership_resolver.get(plan.get("product")),
             "recurring_price": plan.get("amount"),
             "recurring_payment": plan.get("interval"),
             "external_subscription_id": stripe_subscription.id,
@@ -55,6 +53,7 @@ def handle_product_deleted(event: stripe.Event):
     try:
         data: stripe.Product = event.data.object
         Membership.objects.filter(external_product_id=data.id).delete()
+        clear_entry_cost_product_cache()
     except Exception as err:
         logger.error(f"Failed deleting Product from webhook: {err}")
         raise
@@ -8,9 +8,13 @@ setup(
         "django-summernote>=0.8.20.0",
         "phonenumbers>=8.13.17",
         "python-dateutil>=2.8.2",
-        "stripe>=5.5.0",
+        "stripe>=8.11.0",
         "django-allauth>=0.61.1",
     ],
+    extras_require={
+        # Stripe's async client, used by the ASYNC_CHECKOUT views.
+        "async": ["httpx>=0.24"],
+    },
     packages=find_packages(),
     package_data={
         "innovatix.core": ["fixtures/*.json"],